@@ -0,0 +1,370 @@
+# ============================================================
+# ⏱️ DSR DECODER BENCHMARK
+# ============================================================
+# Times the te_verification decoders on synthetic QES responses of a given
+# number of leaf rows and appends the results to a history file, so runs on
+# different commits can be compared.
+#
+#   python bench_decoders.py                          # 1k / 100k / 1M rows
+#   python bench_decoders.py --rows 1000,100000 --sections products,facilities
+#   python bench_decoders.py --modes records,frame --no-memory
+#
+# The responses have the shape of the real visuals: ValueDicts, an S schema
+# per level, nested DM0/M hierarchies for products and facilities, and R
+# bits wherever a value repeats from the previous row.
+
+import argparse
+import copy
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import mock_qes_server as mock
+import te_verification as te
+
+
+# ------------------------------------------------------------
+# SYNTHETIC RESPONSES
+# ------------------------------------------------------------
+ROW_SIZES = (1000, 100000, 1000000)
+
+# header values the product / facility queries are built from
+SAMPLE_ROW = {name: "x" for name in te.SC_HEADER_COLUMNS}
+
+
+def _flat(vd, columns, dicts, rows):
+    # one DM0 level of C rows; a date column is one with no ValueDicts entry
+    S = mock._schema(columns, dicts)
+    for desc, dn in zip(S, dicts):
+        if dn is None:
+            desc["T"] = 7
+    return {"N": "DS0", "PH": [{"DM0": mock._nest([[{"C": c}] for c in rows], [S])}], "ValueDicts": vd}
+
+
+def synth_sc(rows, rng):
+    n = max(1, rows // 10)
+    vd = {
+        "D0": [f"Certification body {i}" for i in range(8)],
+        "D1": [f"Organization {i:06d}" for i in range(n)],
+        "D2": [f"TE-{i:06d}" for i in range(n)],
+        "D3": [""],
+        "D4": [f"CU{i:06d}" for i in range(n)],
+        "D5": [""],
+        "D6": ["India", "China", "Türkiye", "Portugal", "Pakistan"],
+        "D7": [f"CU{i:06d}-2024-{i:08d}" for i in range(rows)],
+        "D8": ["1", "2", "3"],
+        "D9": ["GOTS", "OCS", "GRS", "RCS"],
+        "D10": ["Active", "Suspended", "Withdrawn"],
+    }
+    data = []
+    for i in range(rows):
+        org = (i // 10) % n
+        data.append([
+            org % 8, org, org, 0, org, 0, org % 5, i, rng.randrange(3), rng.randrange(4), 0,
+            (1700000000 + (i // 10) * 3600) * 1000,
+        ])
+    return _flat(vd, [f"G{i}" for i in range(12)], [f"D{i}" for i in range(11)] + [None], data)
+
+
+def synth_contact(rows, rng):
+    n = max(1, rows // 5)
+    vd = {
+        "D0": [f"Contact {i}" for i in range(n)],
+        "D1": [f"{i} Main Street" for i in range(n)],
+        "D2": ["Gujarat", "Jiangsu", "Porto", "Punjab"],
+        "D3": ["India", "China", "Portugal", "Pakistan"],
+        "D4": [f"contact{i}@example.com" for i in range(rows)],
+        "D5": [f"https://example{i}.com" for i in range(n)],
+    }
+    data = [[i // 5 % n, i // 5 % n, i % 4, i % 4, i, i // 5 % n] for i in range(rows)]
+    return _flat(vd, [f"G{i}" for i in range(6)], [f"D{i}" for i in range(6)], data)
+
+
+def synth_certificate(rows, rng):
+    n = max(1, rows // 10)
+    vd = {
+        "D0": [f"CU{i:06d}-2024-{i:08d}" for i in range(rows)],
+        "D1": ["1", "2", "3"],
+        "D2": [f"TE-{i:06d}" for i in range(n)],
+        "D3": [""],
+        "D4": [f"Organization {i:06d}" for i in range(n)],
+        "D5": ["Textile Exchange"],
+        "D6": ["GOTS", "OCS", "GRS", "RCS"],
+    }
+    data = []
+    for i in range(rows):
+        issued = (1700000000 + (i // 10) * 86400) * 1000
+        data.append([i, rng.randrange(3), i // 10 % n, 0, i // 10 % n, issued, issued + 365 * 86400 * 1000, 0, rng.randrange(4)])
+    dicts = ["D0", "D1", "D2", "D3", "D4", None, None, "D5", "D6"]
+    return _flat(vd, [f"G{i}" for i in range(9)], dicts, data)
+
+
+def _windowed(build, rows):
+    # a product / facility query asking for all rows in one window
+    query = copy.deepcopy(build(SAMPLE_ROW)["queries"][0])
+    binding = query["Query"]["Commands"][0]["SemanticQueryDataShapeCommand"]["Binding"]
+    binding["DataReduction"]["Primary"]["Window"]["Count"] = rows
+    return query
+
+
+def synth_products(rows, rng):
+    return mock.synth_products(rows, rng, _windowed(te.build_products_payload, rows), schema=True)
+
+
+def synth_facilities(rows, rng):
+    return mock.synth_facilities(rows, rng, _windowed(te.build_facility_payload, rows), schema=True)
+
+
+GENERATORS = {
+    "sc": synth_sc,
+    "products": synth_products,
+    "facilities": synth_facilities,
+    "contact": synth_contact,
+    "certificate": synth_certificate,
+}
+
+
+def synth_response(section, rows, seed=0):
+    """A single-query QES response body for `section` with `rows` leaf rows."""
+    ds = GENERATORS[section](rows, random.Random(f"{seed}|{section}|{rows}"))
+    return {"jobIds": ["bench"], "results": [mock._wrap(ds)]}
+
+
+# ------------------------------------------------------------
+# DECODERS
+# ------------------------------------------------------------
+# section -> (public decoder, field map, date columns, ValueDicts entries)
+SECTIONS = {
+    "sc": (te.decode, te.SC_HEADER_FIELDS, te.SC_HEADER_DATES, te.SC_HEADER_DICTS),
+    "products": (te.extract_products, te.PRODUCTS_FIELDS, (), te.PRODUCTS_DICTS),
+    "facilities": (te.extract_facilities, te.FACILITY_FIELDS, (), te.FACILITY_DICTS),
+    "contact": (te.decode_contact, te.CONTACT_FIELDS, (), te.CONTACT_DICTS),
+    "certificate": (te.extract_sc, te.CERTIFICATE_FIELDS, te.CERTIFICATE_DATES, te.CERTIFICATE_DICTS),
+}
+
+# parse: JSON codec only; records: the section's public decoder (list of
+# dicts); columns: DSRColumns with dictionary codes; frame: columns plus
+# the Categorical DataFrame; stream: incremental parse + decode (ijson)
+MODES = ("parse", "records", "columns", "frame", "stream")
+
+
+def decoder(section, mode):
+    """fn(js, body) running one decode of `section` the `mode` way."""
+    public, fields, dates, dicts = SECTIONS[section]
+    codec = te.json_codec()
+
+    if mode == "parse":
+        return lambda js, body: codec.loads(body)
+    if mode == "records":
+        return lambda js, body: public(js)
+    if mode == "columns":
+        return lambda js, body: te.DSRColumns(fields, dates, dicts).extend(js)
+    if mode == "frame":
+        return lambda js, body: te.DSRColumns(fields, dates, dicts).extend(js).frame()
+    if mode == "stream":
+        return lambda js, body: te.DSRColumns(fields, dates, dicts).extend_stream(io.BytesIO(body))
+    raise ValueError(f"❌ UNKNOWN MODE: {mode}")
+
+
+def available_modes(modes):
+    skipped = []
+    if "stream" in modes and te._ijson() is None:
+        skipped.append("stream (needs ijson)")
+    if "frame" in modes:
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            skipped.append("frame (needs pandas)")
+    kept = [m for m in modes if not any(s.startswith(m + " ") for s in skipped)]
+    return kept, skipped
+
+
+# ------------------------------------------------------------
+# MEASUREMENT
+# ------------------------------------------------------------
+def time_decoder(fn, js, body, repeat):
+    """Best wall time of `repeat` runs."""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn(js, body)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(fn, js, body):
+    """Peak bytes allocated by one run, input excluded (tracemalloc)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn(js, body)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def run_benchmark(sections, modes, row_sizes, repeat=3, memory=True, seed=0):
+    results = []
+    for rows in row_sizes:
+        for section in sections:
+            js = synth_response(section, rows, seed)
+            body = te.json_codec().dumps(js)
+            for mode in modes:
+                fn = decoder(section, mode)
+                # big inputs are timed once: a single run already takes seconds
+                seconds = time_decoder(fn, js, body, repeat if rows <= 100000 else 1)
+                result = {
+                    "section": section,
+                    "mode": mode,
+                    "rows": rows,
+                    "body_bytes": len(body),
+                    "seconds": round(seconds, 6),
+                    "rows_per_sec": round(rows / seconds) if seconds else None,
+                    "peak_mb": round(peak_memory(fn, js, body) / 1e6, 2) if memory else None,
+                }
+                results.append(result)
+                print_result(result)
+            del js, body
+    return results
+
+
+# ------------------------------------------------------------
+# HISTORY
+# ------------------------------------------------------------
+HISTORY_FILE = "bench_decoders.ndjson"
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_info():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "json_codec": te.json_codec().name,
+    }
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, info, results):
+    with open(path, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps({**info, **result}, ensure_ascii=False) + "\n")
+
+
+def previous_results(history):
+    """Latest earlier result per (section, mode, rows)."""
+    latest = {}
+    for entry in history:
+        latest[(entry["section"], entry["mode"], entry["rows"])] = entry
+    return latest
+
+
+# ------------------------------------------------------------
+# OUTPUT
+# ------------------------------------------------------------
+def print_result(result):
+    peak = f"{result['peak_mb']:>9.1f} MB" if result["peak_mb"] is not None else ""
+    print(
+        f"  {result['section']:<12} {result['mode']:<8} {result['rows']:>9,} rows "
+        f"{result['seconds'] * 1000:>10.1f} ms {result['rows_per_sec'] or 0:>12,} rows/s{peak}"
+    )
+
+
+def print_comparison(results, previous):
+    lines = []
+    for result in results:
+        before = previous.get((result["section"], result["mode"], result["rows"]))
+        if not before or not before.get("rows_per_sec") or not result["rows_per_sec"]:
+            continue
+        change = (result["rows_per_sec"] / before["rows_per_sec"] - 1) * 100
+        lines.append(
+            f"  {result['section']:<12} {result['mode']:<8} {result['rows']:>9,} rows "
+            f"{change:+7.1f}% rows/s vs {before.get('commit') or '?'} ({before['timestamp'][:10]})"
+        )
+    if lines:
+        print("\n📈 CHANGE SINCE LAST RUN")
+        print("\n".join(lines))
+
+
+# ------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------
+def _list(value):
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the te_verification DSR decoders")
+    parser.add_argument("--rows", default=",".join(str(n) for n in ROW_SIZES), help="leaf rows per response, comma separated")
+    parser.add_argument("--sections", default=",".join(SECTIONS), help=f"sections to decode ({', '.join(SECTIONS)})")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"decode paths to time ({', '.join(MODES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per decoder (best is kept; 1 above 100k rows)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory run")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--json-codec", choices=("auto", "orjson", "json"), default="auto", help="JSON library for the parse mode")
+    parser.add_argument("--history", default=HISTORY_FILE, help="NDJSON file the results are appended to")
+    parser.add_argument("--no-history", action="store_true", help="do not read or write the history file")
+    args = parser.parse_args()
+
+    te.configure_json_codec(args.json_codec)
+
+    sections = _list(args.sections)
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+    modes = _list(args.modes)
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+    modes, skipped = available_modes(modes)
+    row_sizes = [int(n) for n in _list(args.rows)]
+
+    info = run_info()
+    print(
+        f"⏱️ DECODER BENCHMARK {info['commit'] or ''} (Python {info['python']}, JSON CODEC: {info['json_codec']})"
+    )
+    for reason in skipped:
+        print(f"⚠️ SKIPPED {reason}")
+
+    results = run_benchmark(sections, modes, row_sizes, args.repeat, memory=not args.no_memory, seed=args.seed)
+
+    if args.no_history:
+        return
+    print_comparison(results, previous_results(load_history(args.history)))
+    append_history(args.history, info, results)
+    print(f"\n📝 RESULTS APPENDED: {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# ============================================================
+# ✅ DSR ROW-SHAPE REGRESSION CHECK
+# ============================================================
+# Decodes the QES responses in fixtures/dsr_shapes.json (the row shapes the
+# visuals send: values left out of C, padded C, nested levels, ...) and
+# compares the records with the expected ones, both from the parsed body
+# and streamed. Exits non-zero on any difference.
+#
+#   python check_dsr_shapes.py
+#   python check_dsr_shapes.py --fixtures other_shapes.json
+
+import argparse
+import io
+import json
+import os
+import sys
+
+import te_verification as te
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "dsr_shapes.json")
+
+# section -> DSRColumns arguments
+SECTIONS = {
+    "sc": (te.SC_HEADER_FIELDS, te.SC_HEADER_DATES, te.SC_HEADER_DICTS, False),
+    "products": (te.PRODUCTS_FIELDS, (), te.PRODUCTS_DICTS, False),
+    "facilities": (te.FACILITY_FIELDS, (), te.FACILITY_DICTS, False),
+    "contact": (te.CONTACT_FIELDS, (), te.CONTACT_DICTS, False),
+    "certificate": (te.CERTIFICATE_FIELDS, te.CERTIFICATE_DATES, te.CERTIFICATE_DICTS, True),
+}
+
+
+def decode(section, js, stream=False):
+    """Records of one response decoded as `section`."""
+    columns = te.DSRColumns(*SECTIONS[section])
+    if stream:
+        columns.extend_stream(io.BytesIO(json.dumps(js).encode("utf-8")))
+    else:
+        columns.extend(js)
+    return columns.records()
+
+
+def check(cases):
+    """Names of the failed cases (with the decode path)."""
+    paths = [False, True] if te._ijson() is not None else [False]
+    failed = []
+    for case in cases:
+        for stream in paths:
+            if decode(case["section"], case["response"], stream) != case["records"]:
+                failed.append(f"{case['name']}{' (stream)' if stream else ''}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the DSR decoder against recorded row shapes")
+    parser.add_argument("--fixtures", default=FIXTURES, help="JSON file of cases (section, response, records)")
+    args = parser.parse_args()
+
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+    if te._ijson() is None:
+        print("⚠️ STREAM PATH SKIPPED (needs ijson)")
+
+    failed = check(cases)
+    for name in failed:
+        print(f"❌ {name}")
+    if failed:
+        sys.exit(1)
+    print(f"✅ {len(cases)} DSR ROW SHAPES DECODE AS EXPECTED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,778 @@
+# ============================================================
+# 🧪 MOCK QES SERVER
+# ============================================================
+# Local stand-in for the QueryExecutionService/public/query endpoint, used to
+# drive te_verification at high concurrency without touching the real capacity.
+#
+#   python mock_qes_server.py --port 8765 --latency 0.2 --error-429 0.02
+#   python mock_qes_server.py --bench 500 --concurrency 8,32,64 --latency 0.2
+#   python mock_qes_server.py --bench 200 --stages --render   # per-stage p50/p95/p99
+#
+# Responses are synthetic DSR shaped like the real report visuals (sized with
+# --products / --facilities) or, with --replay DIR, recordings made with
+# `te_verification.py --record DIR`. By default they use the row shapes the
+# original decoders were written for; --dsr-schema sends an S schema on every
+# level and R-compressed C rows instead. Tokens are signed, expiring MWCTokens
+# issued by a small page at "/" that fires one /query call, the same way the
+# real report does, so the regular Playwright capture works against it.
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import te_verification as te
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+QUERY_PATH = "/webapi/capacities/MOCK/workloads/QES/QueryExecutionService/automatic/public/query"
+
+
+class MockConfig:
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        error_401=0.0,
+        error_429=0.0,
+        error_5xx=0.0,
+        products=40,
+        facilities=12,
+        token_lifetime=3600,
+        replay_dir=None,
+        dsr_schema=False,
+    ):
+        self.latency = latency                  # seconds per POST
+        self.jitter = jitter                    # +/- fraction of latency
+        self.error_401 = error_401              # share of POSTs rejected as unauthorized
+        self.error_429 = error_429              # share of POSTs throttled
+        self.error_5xx = error_5xx              # share of POSTs failing server side
+        self.products = products                # product rows per SC
+        self.facilities = facilities            # facility rows per SC
+        self.token_lifetime = token_lifetime    # seconds until an issued token expires
+        self.replay_dir = replay_dir
+        self.dsr_schema = dsr_schema            # S schemas and R bits instead of the baseline row shapes
+
+
+# SC numbers starting with this prefix have no header row (SC not found)
+MISSING_PREFIX = "MISSING"
+
+VISUAL_HEADER = "8c0cdf793984740d7703"
+VISUAL_PRODUCTS = "637e2cd9d391deed6466"
+VISUAL_FACILITY = "9dcd0600752094910de4"
+VISUAL_CONTACT = "269b05deaa4bee5d72dd"
+VISUAL_CERTIFICATE = "64d20318459ec7516171"
+
+
+# ------------------------------------------------------------
+# TOKENS
+# ------------------------------------------------------------
+_SECRET = os.urandom(16)
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def issue_token(lifetime):
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    claims = _b64(json.dumps({"exp": int(time.time() + lifetime), "jti": os.urandom(6).hex()}).encode())
+    sig = _b64(hmac.new(_SECRET, f"{header}.{claims}".encode(), hashlib.sha256).digest())
+    return f"MWCToken {header}.{claims}.{sig}"
+
+
+def token_valid(auth):
+    if not auth or not auth.startswith("MWCToken "):
+        return False
+    parts = auth.split(" ", 1)[1].split(".")
+    if len(parts) != 3:
+        return False
+    sig = _b64(hmac.new(_SECRET, f"{parts[0]}.{parts[1]}".encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(sig, parts[2]):
+        return False
+    exp = te.token_expiry(auth)
+    return exp is not None and time.time() < exp
+
+
+TOKEN_PAGE = """<!doctype html>
+<html><body>
+<p>Mock QES report</p>
+<script>
+fetch("%(path)s", {
+    method: "POST",
+    headers: {"Authorization": "%(token)s", "Content-Type": "application/json"},
+    body: "{}"
+});
+</script>
+</body></html>
+"""
+
+
+# ------------------------------------------------------------
+# SYNTHETIC DSR
+# ------------------------------------------------------------
+def _wrap(ds):
+    return {
+        "jobId": os.urandom(8).hex(),
+        "result": {
+            "data": {
+                "descriptor": {"Version": 2},
+                "dsr": {"Version": 2, "MinorVersion": 1, "DS": [ds]},
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            }
+        },
+    }
+
+
+def _schema(columns, dicts=None):
+    """S descriptors: `columns` are G names, `dicts` their ValueDicts (None for plain values)."""
+    dicts = dicts or [None] * len(columns)
+    return [{"N": n, "T": 1, "DN": d} if d else {"N": n, "T": 1} for n, d in zip(columns, dicts)]
+
+
+def _repeat(node, schema, previous):
+    """Drop C values equal to the previous row's, flagging them in R by schema position."""
+    positions = [i for i, desc in enumerate(schema) if desc["N"] not in node]
+    values = dict(zip(positions, node["C"]))
+    repeat = 0
+    for i, v in values.items():
+        if i in previous and previous[i] == v:
+            repeat |= 1 << i
+    previous.clear()
+    previous.update(values)
+    if repeat:
+        node["C"] = [v for i, v in values.items() if not repeat >> i & 1]
+        node["R"] = repeat
+
+
+def _nest(paths, schemas=None, depth=0, state=None):
+    """Turn leaf paths (one dict of G values per level) into nested DM nodes,
+    grouping consecutive leaves that share a parent like the service does.
+    With `schemas`, the first node of every level carries that level's S
+    schema, and C values repeated from the previous node of the level are
+    sent as R bits."""
+    state = {} if state is None else state
+    groups = []
+    for path in paths:
+        if groups and groups[-1][0] == path[depth]:
+            groups[-1][1].append(path)
+        else:
+            groups.append((path[depth], [path]))
+
+    nodes = []
+    for head, members in groups:
+        node = dict(head)
+        if schemas and depth not in state:
+            state[depth] = {}
+            node = {"S": schemas[depth], **node}
+        if schemas and "C" in node:
+            _repeat(node, schemas[depth], state[depth])
+        if depth + 1 < len(members[0]):
+            node["M"] = [{f"DM{depth + 1}": _nest(members, schemas, depth + 1, state)}]
+        nodes.append(node)
+    return nodes
+
+
+def _window(query):
+    """(offset, count) requested by the query's Primary window."""
+    window = query["Query"]["Commands"][0]["SemanticQueryDataShapeCommand"]["Binding"]["DataReduction"]["Primary"]["Window"]
+    restart = window.get("RestartTokens")
+    offset = int(restart[0][0].rstrip("L")) if restart else 0
+    return offset, window.get("Count", 500)
+
+
+def _paged(ds, paths, schemas, query):
+    offset, count = _window(query)
+    page = paths[offset:offset + count]
+    ds["PH"] = [{"DM0": _nest(page, schemas)}]
+    if offset + count < len(paths):
+        ds["IC"] = True
+        ds["RT"] = [[f"{offset + count}L"]]
+    return ds
+
+
+def synth_header(sc_number, rng, schema=False):
+    if sc_number.startswith(MISSING_PREFIX):
+        return {"N": "DS0", "PH": [{"DM0": []}], "ValueDicts": {}}
+    vd = {
+        "D0": ["Control Union Certifications"],
+        "D1": [f"Organization {rng.randrange(10000):04d}"],
+        "D2": [f"TE-{rng.randrange(100000):05d}"],
+        "D3": [""],
+        "D4": [f"CU{rng.randrange(1000000):06d}"],
+        "D5": [""],
+        "D6": [rng.choice(["India", "China", "Türkiye", "Portugal", "Pakistan"])],
+        "D7": [sc_number],
+        "D8": [str(rng.randrange(1, 4))],
+        "D9": [rng.choice(["GOTS", "OCS", "GRS", "RCS"])],
+        "D10": ["Active"],
+    }
+    updated = (1700000000 + rng.randrange(30000000)) * 1000
+    if not schema:
+        # empty S; C leaves out the single-valued D8-D10 columns
+        return {"N": "DS0", "PH": [{"DM0": [{"S": [], "C": [0, 0, 0, 0, 0, 0, 0, 0, updated]}]}], "ValueDicts": vd}
+    S = _schema([f"G{i}" for i in range(12)], [f"D{i}" for i in range(11)] + [None])
+    S[-1]["T"] = 7
+    return {"N": "DS0", "PH": [{"DM0": [{"S": S, "C": [0] * 11 + [updated]}]}], "ValueDicts": vd}
+
+
+def synth_products(rows, rng, query, schema=False):
+    n_cat, n_det, n_raw = 8, 20, 30
+    vd = {
+        "D0": [f"PC{i:04d}" for i in range(n_cat)],
+        "D1": [f"Product category {i}" for i in range(n_cat)],
+        "D2": [f"PD{i:04d}" for i in range(n_det)],
+        "D3": [f"Product detail {i}" for i in range(n_det)],
+        "D4": [f"RM{i:04d}" for i in range(n_raw)],
+        "D5": [f"Raw material {i}" for i in range(n_raw)],
+        "D6": ["100.0%", "70.0%", "50.0%", "30.0%", "5.0%"],
+    }
+    paths = []
+    for i in range(rows):
+        cat, det = (i // 10) % n_cat, (i // 2) % n_det
+        paths.append(
+            [
+                {"G0": f"Facility {i // 40:04d}"},
+                {"G1": cat, "G2": cat},
+                {"G3": det, "G4": det},
+                {"G5": i % n_raw, "G6": i % n_raw, "G7": rng.randrange(len(vd["D6"]))},
+            ]
+        )
+    schemas = [
+        _schema(["G0"]),
+        _schema(["G1", "G2"], ["D0", "D1"]),
+        _schema(["G3", "G4"], ["D2", "D3"]),
+        _schema(["G5", "G6", "G7"], ["D4", "D5", "D6"]),
+    ]
+    return _paged({"N": "DS0", "ValueDicts": vd}, paths, schemas if schema else None, query)
+
+
+def synth_facilities(rows, rng, query, schema=False):
+    n_fac, n_proc = max(1, (rows + 2) // 3), 12
+    vd = {
+        "D0": [f"Facility {i:04d}" for i in range(n_fac)],
+        "D1": [f"TE-{rng.randrange(100000):05d}" for _ in range(n_fac)],
+        "D2": [""],
+        "D3": [f"{i} Industrial Road" for i in range(n_fac)],
+        "D4": ["Gujarat", "Jiangsu", "Porto", "Punjab"],
+        "D5": ["India", "China", "Portugal", "Pakistan"],
+        "D6": ["GOTS", "OCS", "GRS", "RCS"],
+        "D7": [f"PR{i:04d}" for i in range(n_proc)],
+        "D8": [f"Process category {i}" for i in range(n_proc)],
+        "D9": ["CU"],
+    }
+    types = ["Production", "Subcontractor", "Warehouse"]
+    paths = []
+    for i in range(rows):
+        fac, region = i // 3, (i // 3) % 4
+        leaf = {
+            "G1": fac, "G2": fac, "G3": 0, "G4": fac, "G5": region, "G6": region,
+            "G7": rng.randrange(4), "G8": i % n_proc, "C": [i % n_proc, 0],
+        }
+        paths.append([{"G0": types[min(i * len(types) // rows, len(types) - 1)]}, leaf])
+    schemas = [
+        _schema(["G0"]),
+        _schema([f"G{i}" for i in range(1, 10)] + ["A0"], [f"D{i}" for i in range(10)]),
+    ]
+    return _paged({"N": "DS0", "ValueDicts": vd}, paths, schemas if schema else None, query)
+
+
+def synth_contact(rng, schema=False):
+    vd = {
+        "D0": [f"Contact {rng.randrange(1000):03d}"],
+        "D1": [f"{rng.randrange(1, 200)} Main Street"],
+        "D2": ["Gujarat"],
+        "D3": ["India"],
+        "D4": ["contact@example.com"],
+        "D5": ["https://example.com"],
+    }
+    if not schema:
+        # no S; C leaves out the single-valued website column
+        return {"N": "DS0", "PH": [{"DM0": [{"C": [0, 0, 0, 0, 0]}]}], "ValueDicts": vd}
+    S = _schema([f"G{i}" for i in range(6)], [f"D{i}" for i in range(6)])
+    return {"N": "DS0", "PH": [{"DM0": [{"S": S, "C": [0, 0, 0, 0, 0, 0]}]}], "ValueDicts": vd}
+
+
+def synth_certificate(sc_number, rng, schema=False):
+    vd = {
+        "D0": [sc_number],
+        "D1": [str(rng.randrange(1, 4))],
+        "D2": [f"TE-{rng.randrange(100000):05d}"],
+        "D3": [""],
+        "D4": [f"Organization {rng.randrange(10000):04d}"],
+        "D5": ["Textile Exchange"],
+        "D6": [rng.choice(["GOTS", "OCS", "GRS", "RCS"])],
+    }
+    issued = (1700000000 + rng.randrange(30000000)) * 1000
+    if not schema:
+        # dictionary columns as named values, the two dates at the end of C
+        S = [{"N": f"G{g}", "T": 1, "DN": f"D{d}"} for g, d in [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4), (7, 5), (8, 6)]]
+        S += [{"N": "G5", "T": 7}, {"N": "G6", "T": 7}]
+        node = {"S": S, "G0": 0, "G1": 0, "G2": 0, "G3": 0, "G4": 0, "G7": 0, "G8": 0}
+        node["C"] = [0, 0, 0, 0, issued, issued + 365 * 86400 * 1000]
+        return {"N": "DS0", "PH": [{"DM0": [node]}], "ValueDicts": vd}
+    S = _schema([f"G{i}" for i in range(9)], ["D0", "D1", "D2", "D3", "D4", None, None, "D5", "D6"])
+    S[5]["T"] = S[6]["T"] = 7
+    C = [0, 0, 0, 0, 0, issued, issued + 365 * 86400 * 1000, 0, 0]
+    return {"N": "DS0", "PH": [{"DM0": [{"S": S, "C": C}]}], "ValueDicts": vd}
+
+
+def synth_result(query, config):
+    visual = query["ApplicationContext"]["Sources"][0]["VisualId"]
+    sc_number = te._query_sc_number(query) or ""
+    # same SC, same data: keeps caches and paging consistent across requests
+    rng = random.Random(f"{sc_number}|{visual}")
+
+    schema = config.dsr_schema
+    if visual == VISUAL_HEADER:
+        return _wrap(synth_header(sc_number, rng, schema))
+    if visual == VISUAL_PRODUCTS:
+        return _wrap(synth_products(config.products, rng, query, schema))
+    if visual == VISUAL_FACILITY:
+        return _wrap(synth_facilities(config.facilities, rng, query, schema))
+    if visual == VISUAL_CONTACT:
+        return _wrap(synth_contact(rng, schema))
+    if visual == VISUAL_CERTIFICATE:
+        return _wrap(synth_certificate(sc_number, rng, schema))
+    raise KeyError(f"unknown visual {visual}")
+
+
+# ------------------------------------------------------------
+# RECORDED DSR
+# ------------------------------------------------------------
+def index_recordings(replay_dir):
+    """query hash -> recording path, for everything under `replay_dir`."""
+    index = {}
+    for root, _, files in os.walk(replay_dir):
+        for name in files:
+            if name.endswith(".json"):
+                index[name[:-5]] = os.path.join(root, name)
+    return index
+
+
+def recorded_result(recordings, payload, query):
+    path = recordings.get(te._query_key(payload, query))
+    if path is None:
+        raise KeyError(f"no recording for {te._query_sc_number(query) or 'query'}")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["response"]["results"][0]
+
+
+# ------------------------------------------------------------
+# HTTP HANDLER
+# ------------------------------------------------------------
+class MockQES:
+    """Threaded mock server; `stats()` reports what it served."""
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        self.config = config
+        self.recordings = index_recordings(config.replay_dir) if config.replay_dir else None
+
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._stats = {"posts": 0, "queries": 0, "bytes": 0, "tokens": 0, "status": {}}
+
+        handler = type("Handler", (_Handler,), {"mock": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def query_url(self):
+        return self.base_url + QUERY_PATH
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-qes", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def _count(self, status, queries=0, size=0):
+        with self._lock:
+            self._stats["posts"] += 1
+            self._stats["queries"] += queries
+            self._stats["bytes"] += size
+            self._stats["status"][str(status)] = self._stats["status"].get(str(status), 0) + 1
+
+    def _fault(self):
+        """Status code to fail this POST with, or None."""
+        c = self.config
+        with self._lock:
+            roll = self._rng.random()
+        for status, rate in ((401, c.error_401), (429, c.error_429), (None, c.error_5xx)):
+            if roll < rate:
+                return status or random.choice((500, 502, 503))
+            roll -= rate
+        return None
+
+    def _delay(self):
+        c = self.config
+        if c.latency > 0:
+            time.sleep(max(0.0, c.latency * (1 + random.uniform(-c.jitter, c.jitter))))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = body if isinstance(body, bytes) else te.json_codec().dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        return len(data)
+
+    def do_GET(self):
+        token = issue_token(self.mock.config.token_lifetime)
+        with self.mock._lock:
+            self.mock._stats["tokens"] += 1
+        page = TOKEN_PAGE % {"path": QUERY_PATH, "token": token}
+        self._send(200, page.encode("utf-8"), "text/html; charset=utf-8")
+
+    def do_POST(self):
+        mock = self.mock
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b"{}"
+
+        mock._delay()
+
+        if not token_valid(self.headers.get("Authorization")):
+            mock._count(401)
+            self._send(401, {"error": {"code": "TokenExpired"}})
+            return
+
+        try:
+            payload = te.json_codec().loads(raw)
+        except ValueError:
+            mock._count(400)
+            self._send(400, {"error": {"code": "InvalidRequest"}})
+            return
+
+        queries = payload.get("queries", [])
+        if not queries:
+            # the token page's own call
+            mock._count(200)
+            self._send(200, {"jobIds": [], "results": []})
+            return
+
+        status = mock._fault()
+        if status is not None:
+            mock._count(status)
+            headers = {"Retry-After": "1"} if status == 429 else None
+            self._send(status, {"error": {"code": f"Mock{status}"}}, headers=headers)
+            return
+
+        try:
+            if mock.recordings is not None:
+                results = [recorded_result(mock.recordings, payload, q) for q in queries]
+            else:
+                results = [synth_result(q, mock.config) for q in queries]
+        except KeyError as e:
+            mock._count(400, len(queries))
+            self._send(400, {"error": {"code": "QueryNotFound", "message": e.args[0]}})
+            return
+
+        size = self._send(200, {"jobIds": [r["jobId"] for r in results], "results": results})
+        mock._count(200, len(queries), size)
+
+
+# ------------------------------------------------------------
+# LOAD HARNESS
+# ------------------------------------------------------------
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class _MockBrowser:
+    """Stands in for the Playwright browser: fetches the token from the mock
+    page. Screenshots are skipped."""
+
+    def __init__(self, mock):
+        self.mock = mock
+
+    def run(self, job, *args, **kwargs):
+        if job is not te._extract_token_playwright:
+            return None
+        html = te.requests.get(self.mock.base_url + "/", timeout=10).text
+        start = html.index("MWCToken ")
+        return html[start:html.index('"', start)]
+
+
+def point_pipeline_at(mock, workdir, use_browser=True):
+    """Redirect te_verification's endpoint, token page and token file to the mock."""
+    te.URL = mock.query_url
+    te.TARGET_URL = mock.base_url + "/"
+    te.TOKEN_FILE = os.path.join(workdir, "token_mock.txt")
+    te.TOKEN_LOCK_FILE = te.TOKEN_FILE + ".lock"
+    te.configure_recording()
+    if not use_browser:
+        manager = _MockBrowser(mock)
+        te.browser_manager = lambda: manager
+
+
+def generate_sc_numbers(n, missing=0.0, seed=0):
+    rng = random.Random(seed)
+    return [
+        f"{MISSING_PREFIX}-{i:06d}" if rng.random() < missing else f"CU-MOCK-{i:06d}"
+        for i in range(n)
+    ]
+
+
+def stage_percentiles(records):
+    """p50/p95/p99/max seconds per stage over the verified SCs' "stages".
+
+    Every "<stage>.<section>" key is reported on its own and summed per SC
+    into "<stage>"; "total" is the SC's elapsed time."""
+    samples = {}
+    for record in records:
+        per_stage = {}
+        for key, seconds in record["stages"].items():
+            samples.setdefault(key, []).append(seconds)
+            name, _, section = key.partition(".")
+            if section:
+                per_stage[name] = per_stage.get(name, 0.0) + seconds
+        for name, seconds in per_stage.items():
+            samples.setdefault(name, []).append(seconds)
+        samples.setdefault("total", []).append(record["elapsed"])
+
+    order = {name: i for i, name in enumerate(te.PIPELINE_STAGES + ("total",))}
+    sections = {name: i for i, name in enumerate(te.SECTIONS)}
+
+    def sort_key(key):
+        name, _, section = key.partition(".")
+        return order.get(name, len(order)), name, sections.get(section, -1), section
+
+    return {
+        key: {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values),
+        }
+        for key, values in sorted(samples.items(), key=lambda kv: sort_key(kv[0]))
+    }
+
+
+def run_load(sc_numbers, concurrency, render=False):
+    """Verify `sc_numbers` against whatever te.URL points at; returns a summary.
+
+    With te stage timing on, the summary also has per-stage percentiles."""
+    te.configure_http_pool(concurrency * te.QUERY_WORKERS)
+
+    latencies = []
+    statuses = {"ok": 0, "not_found": 0, "error": 0, "render_error": 0}
+    errors = {}
+    timed = []
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for fut in as_completed([pool.submit(te.verify_record, sc, render) for sc in sc_numbers]):
+            record = fut.result()
+            statuses[record["status"]] += 1
+            latencies.append(record["elapsed"])
+            if record["status"] in ("error", "render_error"):
+                errors[record["error"]] = errors.get(record["error"], 0) + 1
+            elif record["status"] == "ok" and "stages" in record:
+                timed.append(record)
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "concurrency": concurrency,
+        "total": len(sc_numbers),
+        **statuses,
+        "elapsed": round(elapsed, 3),
+        "per_second": round(len(sc_numbers) / elapsed, 2) if elapsed else None,
+        "latency": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "errors": errors,
+        "http": te.http_pool_stats(),
+        "stages": stage_percentiles(timed) if timed else None,
+    }
+
+
+def print_load_summary(summary, server):
+    lat = summary["latency"]
+    print(
+        f"\n📊 CONCURRENCY {summary['concurrency']}: {summary['total']} SCs in {summary['elapsed']:.2f}s "
+        f"→ {summary['per_second']} SC/s ({summary['ok']} ok, {summary['not_found']} not found, "
+        f"{summary['error']} errors, {summary['render_error']} report errors)"
+    )
+    print(f"🧩 JSON CODEC: {te.json_codec().name}")
+    if lat["p50"] is not None:
+        print(f"⏱️ LATENCY p50 {lat['p50']:.3f}s  p95 {lat['p95']:.3f}s  p99 {lat['p99']:.3f}s  max {lat['max']:.3f}s")
+    if summary["stages"]:
+        print_stage_table(summary["stages"])
+    for message, count in sorted(summary["errors"].items(), key=lambda kv: -kv[1])[:5]:
+        print(f"❌ {count}× {message[:120]}")
+    status = ", ".join(f"{k}: {v}" for k, v in sorted(server["status"].items()))
+    print(
+        f"🖥️ SERVER {server['queries']} QUERIES in {server['posts']} POSTS "
+        f"({server['bytes'] / 1e6:.1f} MB, {server['tokens']} tokens issued; {status})"
+    )
+
+
+def print_stage_table(stages):
+    print(f"⏱️ STAGES (ms, verified SCs)  {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for key, s in stages.items():
+        label = f"  {key}" if "." in key else key
+        print(
+            f"   {label:<25} {s['p50'] * 1000:>9.1f} {s['p95'] * 1000:>9.1f} "
+            f"{s['p99'] * 1000:>9.1f} {s['max'] * 1000:>9.1f}"
+        )
+
+
+# ------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the QES public/query endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="default 8765, or a free port with --bench")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per POST")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency +/- fraction")
+    parser.add_argument("--error-401", type=float, default=0.0, help="share of POSTs answered 401")
+    parser.add_argument("--error-429", type=float, default=0.0, help="share of POSTs answered 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="share of POSTs answered 500/502/503")
+    parser.add_argument("--products", type=int, default=40, help="product rows per SC")
+    parser.add_argument("--facilities", type=int, default=12, help="facility rows per SC")
+    parser.add_argument("--token-lifetime", type=int, default=3600, help="seconds")
+    parser.add_argument("--replay", metavar="DIR", help="serve recordings from DIR instead of synthetic data")
+    parser.add_argument("--dsr-schema", action="store_true", help="send S schemas and R-compressed rows instead of the baseline row shapes")
+    parser.add_argument("--bench", type=int, metavar="N", help="run N SCs through te_verification and exit")
+    parser.add_argument("--concurrency", default="8", help="comma separated levels for --bench, e.g. 8,32,64")
+    parser.add_argument("--missing", type=float, default=0.0, help="share of unknown SC numbers in --bench")
+    parser.add_argument("--sc-file", help="SC numbers for --bench (any te_verification --batch format)")
+    parser.add_argument("--multi-query", type=int, default=1, help="queries per POST in --bench")
+    parser.add_argument("--no-browser", action="store_true", help="read tokens straight from the mock page (and skip screenshots)")
+    parser.add_argument("--stages", action="store_true", help="report p50/p95/p99 per pipeline stage in --bench")
+    parser.add_argument("--render", action="store_true", help="also build the DataFrames, HTML report and screenshot per SC in --bench")
+    parser.add_argument("--output", help="write the --bench summaries as JSON")
+    parser.add_argument("--json-codec", choices=("auto", "orjson", "json"), default="auto", help="JSON library for the server and the pipeline")
+    args = parser.parse_args()
+
+    te.configure_json_codec(args.json_codec)
+
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_401=args.error_401,
+        error_429=args.error_429,
+        error_5xx=args.error_5xx,
+        products=args.products,
+        facilities=args.facilities,
+        token_lifetime=args.token_lifetime,
+        replay_dir=args.replay,
+        dsr_schema=args.dsr_schema,
+    )
+
+    if not args.bench:
+        mock = MockQES(config, args.host, 8765 if args.port is None else args.port)
+        print(f"🧪 MOCK QES LISTENING ON {mock.query_url}")
+        print(f"🔐 TOKEN PAGE: {mock.base_url}/")
+        try:
+            mock.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            mock.httpd.server_close()
+            print(f"🖥️ {mock.stats()}")
+        return
+
+    mock = MockQES(config, args.host, args.port or 0).start()
+    print(f"🧪 MOCK QES LISTENING ON {mock.query_url}")
+
+    if args.sc_file:
+        sc_numbers = te.read_sc_numbers(args.sc_file)[: args.bench]
+    elif args.replay:
+        # one folder per recorded SC, cycled up to N
+        recorded = sorted(
+            d for d in os.listdir(args.replay)
+            if d != "_unknown" and os.path.isdir(os.path.join(args.replay, d))
+        )
+        sc_numbers = [recorded[i % len(recorded)] for i in range(args.bench)] if recorded else []
+    else:
+        sc_numbers = generate_sc_numbers(args.bench, args.missing)
+
+    te.VERBOSE = False
+    if args.multi_query > 1:
+        te.configure_query_batching(args.multi_query)
+    te.configure_stage_timing(args.stages)
+    if args.render and args.no_browser:
+        print("⚠️ SCREENSHOTS SKIPPED (--no-browser)")
+
+    summaries = []
+    with tempfile.TemporaryDirectory(prefix="mock_qes_") as workdir:
+        point_pipeline_at(mock, workdir, use_browser=not args.no_browser)
+        cwd = os.getcwd()
+        if args.render:
+            os.chdir(workdir)  # reports and screenshots are written to the current directory
+        try:
+            for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+                before = mock.stats()
+                summary = run_load(sc_numbers, level, render=args.render)
+                after = mock.stats()
+                server = {
+                    k: after[k] - before[k] for k in ("posts", "queries", "bytes", "tokens")
+                }
+                server["status"] = {
+                    k: v - before["status"].get(k, 0) for k, v in after["status"].items()
+                    if v - before["status"].get(k, 0)
+                }
+                summary["server"] = server
+                print_load_summary(summary, server)
+                summaries.append(summary)
+        finally:
+            os.chdir(cwd)
+            mock.stop()
+
+    if len(summaries) > 1:
+        print("\n📈 THROUGHPUT: " + ", ".join(f"{s['concurrency']} → {s['per_second']} SC/s" for s in summaries))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+        print(f"\n📝 SUMMARY WRITTEN: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,30 @@
 
 import requests
 import json
-import pandas as pd
+import base64
+import copy
+import hashlib
+import sqlite3
+from urllib.parse import urlparse
 import asyncio
-from playwright.async_api import async_playwright
-from tabulate import tabulate
+import atexit
 import os 
-from datetime import datetime, timezone
+import sys
+import csv
+import argparse
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from contextlib import contextmanager
+from itertools import repeat
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 # ------------------------------------------------------------
 # AUTO TOKEN 
 # ------------------------------------------------------------
@@ -21,44 +39,294 @@ TOKEN_FILE = "token_TE.txt"
 
 URL = "https://a9123a0b1c64468fa1e202bef9899172.pbidedicated.windows.net/webapi/capacities/A9123A0B-1C64-468F-A1E2-02BEF9899172/workloads/QES/QueryExecutionService/automatic/public/query"
 
+# Per-query progress output, switched off in batch mode
+VERBOSE = True
+
+
+def log(*args):
+    if VERBOSE:
+        print(*args)
+
+
+# ============================================================
+# STAGE TIMING
+# ============================================================
+# With stage timing on, verify_record() adds a "stages" dict: seconds spent
+# per pipeline stage, keyed "<stage>.<section>" for the work done inside a
+# section's query (e.g. "post.products") and "<stage>" otherwise. Sections
+# run in parallel, so the stages of one SC add up to more than its elapsed
+# time. A multi-query POST is charged to the caller that sent it; with
+# streaming, "decode" also covers downloading and parsing the body.
+STAGE_TIMING = False
+PIPELINE_STAGES = (
+    "token", "post", "parse", "decode", "records", "frame",
+    "html_rows", "template", "write", "screenshot",
+)
+
+_stage_local = threading.local()
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, seconds):
+        with self._lock:
+            self.seconds[key] = self.seconds.get(key, 0.0) + seconds
+
+    def rounded(self):
+        with self._lock:
+            return {key: round(s, 6) for key, s in self.seconds.items()}
+
+
+def configure_stage_timing(enabled=True):
+    global STAGE_TIMING
+    STAGE_TIMING = enabled
+
+
+def current_stage_timer():
+    return getattr(_stage_local, "timer", None), getattr(_stage_local, "section", None)
+
+
+@contextmanager
+def stage_timer(timer, section=None):
+    """Charge the stages run by this thread to `timer` (None: not timed)."""
+    previous = current_stage_timer()
+    _stage_local.timer, _stage_local.section = timer, section
+    try:
+        yield timer
+    finally:
+        _stage_local.timer, _stage_local.section = previous
+
+
+@contextmanager
+def stage(name, section=None):
+    timer, current = current_stage_timer()
+    if timer is None:
+        yield
+        return
+
+    section = section or current
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(f"{name}.{section}" if section else name, time.perf_counter() - t0)
+
+
+# ============================================================
+# BROWSER MANAGER
+# ============================================================
+# One Chromium per process, started on first use and shared by token
+# capture and every screenshot. Playwright objects belong to the event loop
+# that created them, so the browser lives on a private loop thread and
+# callers hand it coroutines; each job gets its own short-lived context.
+BROWSER_MAX_CONTEXTS = 4
+
+
+class BrowserManager:
+    def __init__(self, max_contexts=BROWSER_MAX_CONTEXTS):
+        self.max_contexts = max_contexts
+        self.launches = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="browser-loop", daemon=True)
+        self._thread.start()
+        self._pw = None
+        self._browser = None
+        self._slots = None
+        self._launch_lock = None
+
+    async def _get_browser(self):
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+
+        # concurrent first jobs wait for one launch instead of each starting a browser
+        async with self._launch_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._pw is None:
+                    # only screenshots and token capture need Playwright
+                    from playwright.async_api import async_playwright
+
+                    self._pw = await async_playwright().start()
+                self._browser = await self._pw.chromium.launch(headless=True)
+                self.launches += 1
+        return self._browser
+
+    async def _in_context(self, job, args, context_options):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_contexts)
+
+        async with self._slots:
+            browser = await self._get_browser()
+            context = await browser.new_context(**context_options)
+            try:
+                return await job(context, *args)
+            finally:
+                await context.close()
+
+    def run(self, job, *args, context_options=None):
+        """Run `await job(context, *args)` in a fresh context of the shared browser."""
+        coro = self._in_context(job, args, context_options or {})
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _shutdown(self):
+        if self._browser is not None:
+            await self._browser.close()
+        if self._pw is not None:
+            await self._pw.stop()
+        self._browser = self._pw = None
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_browser_manager = None
+_browser_manager_lock = threading.Lock()
+
+
+def browser_manager():
+    global _browser_manager
+    with _browser_manager_lock:
+        if _browser_manager is None:
+            _browser_manager = BrowserManager()
+            atexit.register(_browser_manager.close)
+        return _browser_manager
+
 
 # ============================================================
 # TOKEN CAPTURE
 # ============================================================
-async def _extract_token_playwright():
-    async with async_playwright() as pw:
-        browser = await pw.chromium.launch(headless=True)
-        page = await browser.new_page()
+# Upper bound (seconds) for loading the page and seeing the first /query call
+TOKEN_CAPTURE_TIMEOUT = 60
+
+# Only the page scripts and the embedded report are needed to trigger the
+# report's /query call; everything below is aborted during token capture.
+TOKEN_CAPTURE_BLOCK = True
+TOKEN_CAPTURE_BLOCKED_TYPES = {"image", "media", "font", "stylesheet", "texttrack", "manifest"}
+TOKEN_CAPTURE_BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "linkedin.com",
+    "licdn.com",
+    "hs-analytics.net",
+    "hs-banner.com",
+    "hubspot.com",
+    "youtube.com",
+    "vimeo.com",
+)
+
+
+def _is_blocked_request(req):
+    if req.resource_type in TOKEN_CAPTURE_BLOCKED_TYPES:
+        return True
+    host = urlparse(req.url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in TOKEN_CAPTURE_BLOCKED_HOSTS)
+
+
+async def _extract_token_playwright(context, timeout=None, block_resources=None):
+    timeout = TOKEN_CAPTURE_TIMEOUT if timeout is None else timeout
+    block_resources = TOKEN_CAPTURE_BLOCK if block_resources is None else block_resources
 
-        token_found = None
+    page = await context.new_page()
 
-        def intercept(req):
-            nonlocal token_found
-            if "/query" in req.url:
-                auth = req.headers.get("authorization", "")
-                if auth.startswith("MWCToken "):
-                    token_found = auth
+    if block_resources:
+        async def block(route):
+            if _is_blocked_request(route.request):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await page.route("**/*", block)
 
-        page.on("request", intercept)
-        await page.goto(TARGET_URL, timeout=500000)
-        await page.wait_for_timeout(30000)
-        await browser.close()
+    token_found = asyncio.get_running_loop().create_future()
 
-        return token_found
+    def intercept(req):
+        if "/query" in req.url and not token_found.done():
+            auth = req.headers.get("authorization", "")
+            if auth.startswith("MWCToken "):
+                token_found.set_result(auth)
+
+    async def capture():
+        # the embedded report fires /query on its own, no need to wait for "load"
+        await page.goto(TARGET_URL, wait_until="commit", timeout=0)
+        return await token_found
+
+    page.on("request", intercept)
+    try:
+        return await asyncio.wait_for(capture(), timeout)
+    except asyncio.TimeoutError:
+        return None
 
 
 # ============================================================
 # TOKEN STORAGE
 # ============================================================
-def generate_new_token():
-    token = asyncio.run(_extract_token_playwright())
-    if not token:
-        raise Exception("❌ TOKEN NOT CAPTURED")
+# Regeneration is single-flight: one thread holds the in-process lock, one
+# process holds the lock file, and everyone queued behind them reuses the
+# token they wrote instead of launching another browser.
+TOKEN_LOCK_FILE = TOKEN_FILE + ".lock"
+
+_token_lock = threading.Lock()
+
+
+@contextmanager
+def _token_file_lock():
+    with open(TOKEN_LOCK_FILE, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
 
-    with open(TOKEN_FILE, "w") as f:
+def _write_token(token):
+    tmp = f"{TOKEN_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
         f.write(token)
+    os.replace(tmp, TOKEN_FILE)
 
-    print("🔐 NEW TOKEN GENERATED")
+
+def generate_new_token(replaces=None):
+    """Capture a new token. `replaces` is the token the caller found stale
+    (None if it had none); if another caller already stored a different,
+    unexpired token it is returned without launching a browser."""
+    with _token_lock, _token_file_lock():
+        current = load_token()
+        if current and current != replaces and time.time() < token_expires_at(current):
+            return current
+
+        token = browser_manager().run(_extract_token_playwright)
+        if not token:
+            raise Exception("❌ TOKEN NOT CAPTURED")
+
+        _write_token(token)
+
+    expires = datetime.fromtimestamp(token_expires_at(token)).strftime("%H:%M:%S")
+    print(f"🔐 NEW TOKEN GENERATED (valid until ~{expires})")
     return token
 
 
@@ -71,351 +339,1340 @@ def load_token():
 
 def get_token():
     token = load_token()
-    if token:
+    if token and time.time() < token_expires_at(token):
         return token
-    return generate_new_token()
+    return generate_new_token(replaces=token)
+
+
+# ============================================================
+# TOKEN LIFETIME
+# ============================================================
+TOKEN_REFRESH_MARGIN = 300     # refresh this many seconds before expiry
+TOKEN_DEFAULT_LIFETIME = 3600  # assumed lifetime when the token has no "exp" claim
+
+
+def token_expiry(token):
+    """Expiry (epoch seconds) from the token's JWT "exp" claim, or None."""
+    parts = token.split(" ", 1)[-1].split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+        return float(claims["exp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def token_expires_at(token):
+    exp = token_expiry(token)
+    if exp is not None:
+        return exp
+    try:
+        return os.path.getmtime(TOKEN_FILE) + TOKEN_DEFAULT_LIFETIME
+    except OSError:
+        return time.time() + TOKEN_DEFAULT_LIFETIME
+
+
+class TokenRefresher(threading.Thread):
+    """Regenerates the token in the background shortly before it expires."""
+
+    def __init__(self, margin=TOKEN_REFRESH_MARGIN):
+        super().__init__(name="token-refresher", daemon=True)
+        self.margin = margin
+        self.refreshes = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        last_refresh = 0
+        while not self._stopped.is_set():
+            token = load_token()
+            # no token yet: the first query creates it
+            wait_s = token_expires_at(token) - self.margin - time.time() if token else 60
+
+            # never loop faster than once a minute, even on short-lived tokens
+            wait_s = max(wait_s, last_refresh + 60 - time.time())
+            if wait_s > 0:
+                # re-read the file periodically in case someone else refreshed it
+                self._stopped.wait(min(wait_s, 60))
+                continue
+
+            try:
+                generate_new_token(replaces=token)
+                self.refreshes += 1
+            except Exception as e:
+                print(f"⚠️ BACKGROUND TOKEN REFRESH FAILED: {e}")
+            last_refresh = time.time()
+
+    def stop(self):
+        self._stopped.set()
+
+
+# ============================================================
+# HTTP SESSION
+# ============================================================
+# One keep-alive session shared by every query, so the TCP + TLS handshake
+# to the QES host is paid once per pooled connection instead of per POST.
+HTTP_POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure_http_pool(pool_size):
+    global HTTP_POOL_SIZE, _session
+    with _session_lock:
+        HTTP_POOL_SIZE = max(1, int(pool_size))
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=HTTP_POOL_SIZE,
+                pool_block=True,
+            )
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def http_pool_stats():
+    stats = {"pool_size": HTTP_POOL_SIZE, "requests": 0, "connections": 0, "reused": 0}
+
+    with _session_lock:
+        if _session is None:
+            return stats
+        pools = []
+        for adapter in set(_session.adapters.values()):
+            pm = adapter.poolmanager
+            pools += [pm.pools[key] for key in pm.pools.keys()]
+
+    for pool in pools:
+        stats["requests"] += pool.num_requests
+        stats["connections"] += pool.num_connections
+    stats["reused"] = max(0, stats["requests"] - stats["connections"])
+    return stats
+
+
+# ============================================================
+# JSON CODEC
+# ============================================================
+# Request bodies, response bodies, cached and replayed responses and batch
+# records go through one codec: orjson when it is installed, the stdlib
+# json module otherwise. Cache keys and template text stay on the stdlib
+# encoder (_canonical), so they do not depend on the codec in use.
+JSON_CODEC = "auto"   # "auto", "orjson" or "json"
+
+_json_codec = None
+
+
+class StdlibJSONCodec:
+    name = "json"
+
+    def dumps(self, obj, default=None):
+        """Compact UTF-8 JSON bytes."""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+
+    def dumps(self, obj, default=None):
+        return self._orjson.dumps(obj, default=default)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+def configure_json_codec(name="auto"):
+    global JSON_CODEC, _json_codec
+    if name not in ("auto", "orjson", "json"):
+        raise ValueError(f"❌ UNKNOWN JSON CODEC: {name} (expected auto, orjson or json)")
+    JSON_CODEC = name
+    _json_codec = None
+    return json_codec()
+
+
+def json_codec():
+    global _json_codec
+    if _json_codec is None:
+        codec = None
+        if JSON_CODEC in ("auto", "orjson"):
+            try:
+                codec = OrjsonCodec()
+            except ImportError:
+                if JSON_CODEC == "orjson":
+                    raise Exception("❌ JSON CODEC orjson IS NOT INSTALLED (pip install orjson)")
+        _json_codec = codec or StdlibJSONCodec()
+    return _json_codec
+
+
+# ============================================================
+# RECORD / REPLAY
+# ============================================================
+# Record mode stores every successful query as a request/response pair
+# under RECORD_DIR/<SC number>/<query hash>.json; replay mode answers
+# post_with_auto_token from those files without a token or network access.
+# Multi-query POSTs are split per query, so recordings replay the same
+# whether or not queries were batched.
+RECORD_DIR = None
+REPLAY_DIR = None
+
+_replay_index = None
+_replay_lock = threading.Lock()
+
+
+def configure_recording(record_dir=None, replay_dir=None):
+    global RECORD_DIR, REPLAY_DIR, _replay_index
+    RECORD_DIR = record_dir
+    REPLAY_DIR = replay_dir
+    _replay_index = None
+
+
+def _query_key(payload, query):
+    canonical = json.dumps(
+        [payload.get("version"), payload.get("modelId"), query],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _query_sc_number(query):
+    """SC number a query filters on, from its "SC Number | SC Version No" or SC_Number condition."""
+    try:
+        where = query["Query"]["Commands"][0]["SemanticQueryDataShapeCommand"]["Query"]["Where"]
+    except (KeyError, IndexError):
+        return None
+
+    for cond in where:
+        condition = cond.get("Condition", {})
+        contains = condition.get("Contains")
+        if contains and contains["Left"].get("Column", {}).get("Property") == "SC Number | SC Version No":
+            return contains["Right"]["Literal"]["Value"].strip("'")
+
+        in_ = condition.get("In")
+        if in_ and in_["Expressions"][0].get("Column", {}).get("Property") == "SC_Number":
+            return in_["Values"][0][0]["Literal"]["Value"].strip("'")
+    return None
+
+
+def _recording_dir(base, sc_number):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in (sc_number or "_unknown"))
+    return os.path.join(base, safe)
+
+
+def record_response(payload, body):
+    for query, result in zip(payload["queries"], body.get("results", [])):
+        sc_number = _query_sc_number(query)
+        single = dict(payload, queries=[query])
+        entry = {
+            "sc_number": sc_number,
+            "recorded": datetime.now(timezone.utc).isoformat(),
+            "request": single,
+            "response": dict(body, results=[result]),
+        }
+
+        folder = _recording_dir(RECORD_DIR, sc_number)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, _query_key(payload, query) + ".json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+
+def _replay_entry(key):
+    global _replay_index
+    with _replay_lock:
+        if _replay_index is None:
+            _replay_index = {}
+            for root, _, files in os.walk(REPLAY_DIR):
+                for name in files:
+                    if name.endswith(".json"):
+                        _replay_index[name[:-5]] = os.path.join(root, name)
+        path = _replay_index.get(key)
+
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        return json_codec().loads(f.read())
+
+
+def replay_response(url, payload):
+    results = []
+    body = {}
+    for query in payload["queries"]:
+        entry = _replay_entry(_query_key(payload, query))
+        if entry is None:
+            raise Exception(f"❌ NO RECORDING FOR {_query_sc_number(query) or 'query'} IN {REPLAY_DIR}")
+        body = entry["response"]
+        results += body["results"]
+
+    res = requests.Response()
+    res.status_code = 200
+    res.url = url
+    res.encoding = "utf-8"
+    res.headers["Content-Type"] = "application/json"
+    res._content = json_codec().dumps(dict(body, results=results))
+    return res
 
 
 # ============================================================
 # AUTO TOKEN REQUEST
 # ============================================================
-def post_with_auto_token(url, headers=None, json=None):
+def post_with_auto_token(url, headers=None, json=None, stream=False):
+    if REPLAY_DIR:
+        with stage("post"):
+            return replay_response(url, json)
+
     headers = dict(headers) if headers else {}
 
     headers.setdefault("Content-Type", "application/json")
-    headers["Authorization"] = get_token()
+    with stage("token"):
+        headers["Authorization"] = get_token()
 
-    res = requests.post(url, headers=headers, json=json)
+    body = payload_body(json)
+
+    session = get_session()
+    with stage("post"):
+        res = session.post(url, headers=headers, data=body, stream=stream)
 
     if res.status_code == 401:
         print("⚠️ TOKEN EXPIRED → REGENERATING")
-        token = generate_new_token()
+        res.close()
+        with stage("token"):
+            token = generate_new_token(replaces=headers["Authorization"])
         headers["Authorization"] = token
-        res = requests.post(url, headers=headers, json=json)
+        with stage("post"):
+            res = session.post(url, headers=headers, data=body, stream=stream)
+
+    if RECORD_DIR and res.status_code == 200 and not stream:
+        record_response(json, json_codec().loads(res.content))
 
     return res
 
-# Open the HTML file in a headless browser and save a full-page screenshot
-async def screenshot_html(html_path, output_png):
-        
-    async with async_playwright() as pw:
-        browser = await pw.chromium.launch(headless=True)
-
-        page = await browser.new_page(
-            viewport={"width": 1400, "height": 900},
-            device_scale_factor=2 
-        )
 
-        await page.goto(
-            "file://" + os.path.abspath(html_path),
-            wait_until="networkidle"
-        )
+# ============================================================
+# MULTI-QUERY BATCHING
+# ============================================================
+# Every payload already carries a "queries" array. Queries submitted by
+# concurrent callers within MULTI_QUERY_LINGER seconds are packed into one
+# POST (up to MULTI_QUERY_MAX) and the "results" array is split back per
+# caller, in order, so each decoder still sees a single-query response.
+MULTI_QUERY_MAX = 1
+MULTI_QUERY_LINGER = 0.01
+
+_query_batcher = None
+
+
+def _query_body(res, label=""):
+    if res.status_code != 200:
+        raise Exception(f"❌ ERROR{' ' + label if label else ''}: {res.text}")
+    with stage("parse"):
+        return json_codec().loads(res.content)
+
+
+class QueryBatcher:
+    def __init__(self, max_queries=8, linger=0.01):
+        self.max_queries = max_queries
+        self.linger = linger
+        self.posts = 0
+        self.queries = 0
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def submit(self, payload, label=""):
+        fut = Future()
+
+        with self._lock:
+            self._pending.append((payload, label, fut))
+            leader = len(self._pending) == 1
+            batch = self._take() if len(self._pending) >= self.max_queries else None
+
+        if batch:
+            self._send(batch)
+        elif leader:
+            # first caller of a window waits for others to join, then flushes
+            time.sleep(self.linger)
+            with self._lock:
+                batch = self._take()
+            if batch:
+                self._send(batch)
+
+        return fut.result()
+
+    def _take(self):
+        batch = self._pending[: self.max_queries]
+        del self._pending[: self.max_queries]
+        return batch
+
+    def _send(self, batch):
+        # only queries against the same model can share a POST
+        groups = {}
+        for item in batch:
+            payload = item[0]
+            key = (payload["version"], payload["modelId"], payload["allowLongRunningQueries"])
+            groups.setdefault(key, []).append(item)
+
+        for items in groups.values():
+            merged = merge_payloads([payload for payload, _, _ in items])
+            labels = ", ".join(sorted({label for _, label, _ in items if label}))
+
+            try:
+                js = _query_body(post_with_auto_token(URL, headers=BASE_HEADERS, json=merged), labels)
+                results = js["results"]
+                if len(results) != len(merged["queries"]):
+                    raise Exception(
+                        f"❌ ERROR {labels}: {len(results)} results for {len(merged['queries'])} queries"
+                    )
+            except Exception as e:
+                for _, _, fut in items:
+                    fut.set_exception(e)
+                continue
 
-        await page.screenshot(
-            path=output_png,
-            full_page=True
-        )
+            with self._lock:
+                self.posts += 1
+                self.queries += len(merged["queries"])
 
-        await browser.close()
+            start = 0
+            for payload, _, fut in items:
+                end = start + len(payload["queries"])
+                fut.set_result(dict(js, results=results[start:end]))
+                start = end
 
 
-# ------------------------------------------------------------
-# USER INPUT
-# ------------------------------------------------------------
-sc_number = input("➡️ Enter SC Number: ").strip()
+def configure_query_batching(max_queries, linger=MULTI_QUERY_LINGER):
+    global MULTI_QUERY_MAX, MULTI_QUERY_LINGER, _query_batcher
+    MULTI_QUERY_MAX = max(1, int(max_queries))
+    MULTI_QUERY_LINGER = linger
+    _query_batcher = QueryBatcher(MULTI_QUERY_MAX, linger) if MULTI_QUERY_MAX > 1 else None
+
+
+def query_batching_stats():
+    if _query_batcher is None:
+        return None
+    return {"posts": _query_batcher.posts, "queries": _query_batcher.queries}
+
+
+def sc_version(row):
+    """Cache version key of an SC header row, None when it has no last-updated date.
+
+    Keyed on SC_Last_Updated_Date in epoch millis, so an update later the same
+    day is a new version; a row that only has the 'YYYY-MM-DD' day keys on that."""
+    updated = row["LastUpdated_Timestamp"]
+    if _isna(updated):
+        return None
+    if isinstance(updated, datetime):
+        # naive UTC, from first(datetimes=True) or a frame (pd.Timestamp)
+        updated = (updated - _EPOCH) // timedelta(milliseconds=1)
+    elif isinstance(updated, float):
+        updated = int(updated)
+    return f"{row['SC Number']}|{row['SC Version Number']}|{updated}"
+
+
+def run_query(payload, label="", version=None, ttl=None):
+    """POST one payload (through the multi-query batcher when enabled) and return the response body.
+
+    `version` ties a cached response to an SC header version instead of
+    CACHE_TTL; `ttl` overrides how long a new response stays cached (<= 0:
+    not cached at all)."""
+    key = None
+    if version is not None:
+        ttl = VERSIONED_CACHE_TTL
+    if _response_cache is not None and (ttl is None or ttl > 0):
+        key = ResponseCache.key(URL, payload, version)
+        js = _response_cache.get(key)
+        if js is not None:
+            return js
+
+    if _query_batcher is not None:
+        js = _query_batcher.submit(payload, label)
+    else:
+        js = _query_body(post_with_auto_token(URL, headers=BASE_HEADERS, json=payload), label)
+
+    if key is not None:
+        _response_cache.put(key, js, ttl)
+    return js
+
+
+# ============================================================
+# RESPONSE CACHE
+# ============================================================
+# Successful responses are stored in SQLite keyed by a hash of the
+# canonical (sorted-key) payload JSON, served while younger than CACHE_TTL,
+# and evicted least-recently-used once the cache grows past CACHE_MAX_BYTES.
+CACHE_PATH = "te_cache.sqlite"
+CACHE_TTL = 4 * 3600
+CACHE_MAX_BYTES = 256 * 1000 * 1000
+
+# Queries that depend on an SC are versioned by the header's
+# SC_Last_Updated_Date: while it is unchanged they are served from the cache
+# whatever their age, and the header query itself is the freshness check.
+SC_HEADER_CACHE_TTL = 0
+VERSIONED_CACHE_TTL = 30 * 24 * 3600
+
+# SC numbers the service returned no rows for are rejected locally for a while
+NEGATIVE_CACHE_TTL = 15 * 60
+
+_response_cache = None
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            # it is only a cache: drop tables from older layouts
+            columns = [r[1] for r in self._db.execute("PRAGMA table_info(responses)")]
+            if columns and "expires" not in columns:
+                self._db.execute("DROP TABLE responses")
+                self._db.execute("DROP TABLE IF EXISTS responses_size")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, body TEXT NOT NULL, "
+                "expires REAL NOT NULL, used REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+
+            # total size of the stored bodies, kept by triggers so every process
+            # sharing the file sees the same figure without a SUM per put
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "INSERT OR IGNORE INTO responses_size SELECT 0, COALESCE(SUM(size), 0) FROM responses"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses "
+                "BEGIN UPDATE responses_size SET bytes = bytes + NEW.size; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses "
+                "BEGIN UPDATE responses_size SET bytes = bytes + NEW.size - OLD.size; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses "
+                "BEGIN UPDATE responses_size SET bytes = bytes - OLD.size; END"
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def key(url, payload, version=None):
+        # same text as _canonical([url, payload, version]), without re-serializing a templated payload
+        canonical = f"[{_canonical(url)},{payload_text(payload)},{_canonical(version)}]"
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json_codec().loads(row[0])
+
+    def put(self, key, body, ttl=None):
+        text = json_codec().dumps(body).decode("utf-8")
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            # an upsert rather than INSERT OR REPLACE: REPLACE's implicit delete skips the triggers
+            self._db.execute(
+                "INSERT INTO responses VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "body = excluded.body, expires = excluded.expires, used = excluded.used, size = excluded.size",
+                (key, text, expires, now, len(text)),
+            )
+            if self._size() > self.max_bytes:
+                self._evict(now)
+
+    def _size(self):
+        return self._db.execute("SELECT bytes FROM responses_size").fetchone()[0]
+
+    def _evict(self, now):
+        self.evictions += self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,)).rowcount
+
+        # least recently used first, a few at a time along the index; other
+        # processes may be evicting too, so only rows actually removed count
+        while self._size() > self.max_bytes:
+            keys = [key for (key,) in self._db.execute("SELECT key FROM responses ORDER BY used LIMIT 64")]
+            if not keys:
+                break
+            for key in keys:
+                if self._size() <= self.max_bytes:
+                    break
+                self.evictions += self._db.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            size = self._size()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def configure_response_cache(path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+    """Enable the on-disk response cache (path=None disables it)."""
+    global _response_cache
+    if _response_cache is not None:
+        _response_cache.close()
+    _response_cache = ResponseCache(path, ttl, max_bytes) if path else None
+
+
+def response_cache_stats():
+    if _response_cache is None:
+        return None
+    return _response_cache.stats()
 
 
 # ------------------------------------------------------------
-# SC Header Table
+# NEGATIVE CACHE
 # ------------------------------------------------------------
+# Kept in the same SQLite file but apart from the response cache: streaming
+# and recording runs still reject unknown SC numbers locally.
+_not_found_cache = None
+
+
+class NotFoundCache:
+    def __init__(self, path=CACHE_PATH, ttl=NEGATIVE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.rejections = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS not_found (sc_number TEXT PRIMARY KEY, expires REAL NOT NULL)"
+        )
 
-payload = {
-    "version": "1.0.0",
-    "allowLongRunningQueries": True,
-    "modelId": 4668616,
-    "queries": [
-        {
-            "QueryId": "",
-            "ApplicationContext": {
-                "DatasetId": "30385b55-d526-401d-8379-6a502d67c719",
-                "Sources": [
-                    {
-                        "ReportId": "5bbb73cf-c2c7-4c8d-8461-f04b75a9438b",
-                        "VisualId": "8c0cdf793984740d7703",
-                    }
-                ],
-            },
-            "Query": {
-                "Commands": [
-                    {
-                        "SemanticQueryDataShapeCommand": {
-                            "Query": {
-                                "Version": 2,
-                                "From": [
-                                    {
-                                        "Name": "s1",
-                                        "Entity": "semantic vw_ScopeCertificate_SuppyChainOperator",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s",
-                                        "Entity": "semantic vw_ScopeCertificateStandard",
-                                        "Type": 0,
-                                    },
-                                ],
-                                "Select": [
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "CB_Name",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SCO_Name",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "CO_Te_Id",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "Retired_CO_Te_Id",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SCO_License",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SCO_Native_Name",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SCO_Country",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SC_Number",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SC_Version_No",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s"}
-                                            },
-                                            "Property": "Grouped SC Standard",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SC_Status",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SC_Last_Updated_Date",
-                                        }
-                                    },
-                                ],
-                                "Where": [
-                                    {
-                                        "Condition": {
-                                            "Contains": {
-                                                "Left": {
-                                                    "Column": {
-                                                        "Expression": {
-                                                            "SourceRef": {
-                                                                "Source": "s1"
-                                                            }
-                                                        },
-                                                        "Property": "SC Number | SC Version No",
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Literal": {
-                                                        "Value": f"'{sc_number}'"
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                ],
-                            },
-                            "Binding": {
-                                "Primary": {
-                                    "Groupings": [
-                                        {
-                                            "Projections": [
-                                                0,
-                                                1,
-                                                2,
-                                                3,
-                                                4,
-                                                5,
-                                                6,
-                                                7,
-                                                8,
-                                                9,
-                                                10,
-                                                11,
-                                            ]
-                                        }
-                                    ]
-                                },
-                                "DataReduction": {
-                                    "DataVolume": 3,
-                                    "Primary": {"Window": {"Count": 500}},
-                                },
-                                "Version": 1,
-                            },
-                        }
-                    }
-                ]
-            },
-        }
-    ],
-}
+    def is_not_found(self, sc_number):
+        with self._lock:
+            row = self._db.execute("SELECT expires FROM not_found WHERE sc_number = ?", (sc_number,)).fetchone()
+            if row is None or row[0] <= time.time():
+                return False
+            self.rejections += 1
+            return True
 
+    def mark_not_found(self, sc_number, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO not_found VALUES (?, ?)", (sc_number, expires))
 
-# REQUEST 
-print("\n📡 Fetching SC Header Table...")
+    def stats(self):
+        return {"rejections": self.rejections}
 
-res = post_with_auto_token(URL, headers=BASE_HEADERS, json=payload)
+    def close(self):
+        with self._lock:
+            self._db.close()
 
-if res.status_code != 200:
-    print("❌ ERROR:", res.text)
-    exit()
 
-js = res.json()
+def configure_not_found_cache(path=CACHE_PATH, ttl=NEGATIVE_CACHE_TTL):
+    """Enable the negative cache of unknown SC numbers (path=None or ttl <= 0 disables it)."""
+    global _not_found_cache
+    if _not_found_cache is not None:
+        _not_found_cache.close()
+    _not_found_cache = NotFoundCache(path, ttl) if path and ttl > 0 else None
 
 
-# ==========================================
-# DECODE SC Header Table
-# ==========================================
+def not_found_cache_stats():
+    if _not_found_cache is None:
+        return None
+    return _not_found_cache.stats()
 
-def decode(js):
-    try:
-        ds = js["results"][0]["result"]["data"]["dsr"]["DS"][0]
-    except:
-        return []
 
-    vd = ds.get("ValueDicts", {})
-    rows_raw = ds["PH"][0]["DM0"]
+# ============================================================
+# RESULT PAGING
+# ============================================================
+# Queries ask for a 500-row window. When more rows exist the service flags
+# the DS as incomplete ("IC") and returns restart tokens ("RT"); the next
+# window is requested by sending them back in Window.RestartTokens.
+MAX_PAGES = 200
 
-    rows = []
 
-    def get(dict_name, idx):
-        try:
-            return vd[dict_name][idx]
-        except:
-            return None
+def _with_restart_tokens(payload, restart_tokens):
+    payload = copy.deepcopy(payload)
+    for q in payload["queries"]:
+        for cmd in q["Query"]["Commands"]:
+            binding = cmd["SemanticQueryDataShapeCommand"]["Binding"]
+            binding["DataReduction"]["Primary"]["Window"]["RestartTokens"] = restart_tokens
+    return payload
+
+
+def iter_query_pages(payload, label="", version=None, ttl=None):
+    """Yield one response body per window until the dataset is exhausted."""
+    for _ in range(MAX_PAGES):
+        js = run_query(payload, label, version, ttl)
+        yield js
+
+        ds = dsr_dataset(js)
+        if ds is None:
+            return
+        if not ds.get("IC") or not ds.get("RT"):
+            return
+
+        payload = _with_restart_tokens(payload, ds["RT"])
 
-    for row in rows_raw:
-        C = row["C"]
+    print(f"⚠️ {label or 'SC HEADER'} RESULT TRUNCATED AFTER {MAX_PAGES} PAGES")
 
-        # ----------------------------
-        # dernier élément du array C
-        # ----------------------------
-        ts = C[-1] if isinstance(C[-1], int) else None
 
-        if ts:
-            last_update = datetime.utcfromtimestamp(ts / 1000).strftime("%Y-%m-%d")
+# ============================================================
+# DSR DECODER
+# ============================================================
+# A DM level can carry its schema once, in the "S" list of its first row:
+# one descriptor per column with the column name ("G0", "A0", ...) and, for
+# dictionary-encoded columns, the ValueDicts entry it indexes ("DN"). Levels
+# sent without one (or with an empty "S") use the section's fields in order,
+# with the ValueDicts entries given by the section's `dicts` map.
+#
+# A row gives its values as named keys and positionally in "C". C fills the
+# columns after the row's last named one, in schema order, skipping those
+# flagged in the "R" bitmask (repeat the previous row's value) or in "Ø"
+# (null); both flags are indexed by schema position. When C is short, the
+# values left out are those of the last dictionary-encoded columns: one whose
+# ValueDicts entry holds a single value takes it (the header sends no index
+# for its one-value D8-D10), any other decodes to None with a warning. A long
+# C has its extra values ignored with a warning, except in sections decoded
+# with `c_tail`, where C holds the columns' values at its end (certificate
+# rows pad it with leading zeros). Columns a row does not send keep the
+# previous row's value.
+# Rows with an "M" list nest the next level; every leaf is one output row.
+#
+# Dictionary-encoded columns can also be kept as integer codes into a
+# ValueDictionary, so large results never materialize one string per row;
+# DSRColumns collects a section that way and turns it into records, a
+# DataFrame of Categoricals or an Arrow table of DictionaryArrays on demand.
+DSR_REPEAT = "R"
+DSR_NULL = "Ø"
+
+
+def dsr_dataset(js):
+    """First DS of a single-query QES response, or None when it has none."""
+    try:
+        return js["results"][0]["result"]["data"]["dsr"]["DS"][0]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+class ValueDictionary(list):
+    """Distinct values of one dictionary-encoded output column; the column's
+    integer codes index this list. Reused across pages, so codes stay stable
+    when every page sends its own ValueDicts."""
+
+    def __init__(self):
+        super().__init__()
+        self._codes = {}
+
+    def code_table(self, values):
+        # ValueDicts entry index -> code in this dictionary (None for null values)
+        table = []
+        for v in values:
+            if v is None:
+                table.append(None)
+                continue
+            code = self._codes.get(v)
+            if code is None:
+                code = self._codes[v] = len(self)
+                self.append(v)
+            table.append(code)
+        return table
+
+
+def _dm_blocks(blocks):
+    # PH and M are both lists of {"DM<n>": [rows]}
+    return [(dm, rows) for block in blocks for dm, rows in block.items()]
+
+
+def dsr_leaf_count(blocks):
+    """Number of leaf rows (output rows) under a PH or M list."""
+    count = 0
+    stack = [blocks]
+    while stack:
+        for block in stack.pop():
+            for rows in block.values():
+                for node in rows:
+                    if "M" in node:
+                        stack.append(node["M"])
+                    else:
+                        count += 1
+    return count
+
+
+# placeholder of a value left out of C while the ValueDicts are not known yet
+_LEFT_OUT = object()
+
+
+class _DSRWalker:
+    """Decoding state of one DS: the schema and previous row of every DM
+    level, and the output columns. Trees can be fed in several walk() calls,
+    or row by row with row() and append_row().
+
+    Without `value_dicts` (they have not been parsed yet) dictionary-encoded
+    columns keep their ValueDicts indices until resolve() is called."""
+
+    def __init__(self, fields, value_dicts=None, dictionaries=None, dicts=None, c_tail=False):
+        self.out_names = list(fields.values())
+        self.out_index = {key: i for i, key in enumerate(fields)}
+        self.value_dicts = value_dicts
+        self.dictionaries = dictionaries
+        self.default_schema = [{"N": key, "DN": dicts[key]} if dicts and key in dicts else {"N": key} for key in fields]
+        self.buffers = [[] for _ in self.out_names]
+        self.current = [None] * len(self.out_names)
+        self.rows = 0
+        # DM name -> ([(position, column name, value dict, output position)],
+        #             positions of dictionary-encoded columns)
+        self.schemas = {}
+        self.deferred = {}  # output position -> [(first row, DN)] until resolve()
+        self.left_out = set()  # output positions holding _LEFT_OUT
+        self.c_tail = c_tail
+        self.warned = set()
+
+    def _warn(self, message):
+        # once per walker: a malformed level usually repeats on every row
+        if message not in self.warned:
+            self.warned.add(message)
+            print(f"⚠️ {message}")
+
+    def _value_dict(self, dn, pos):
+        values = self.value_dicts.get(dn)
+        if values is not None and self.dictionaries is not None:
+            dictionary = self.dictionaries.setdefault(self.out_names[pos], ValueDictionary())
+            values = dictionary.code_table(values)
+        return values
+
+    def _code(self, pos, v):
+        # a value sent as itself in a dictionary-encoded column, as a code
+        return self.dictionaries.setdefault(self.out_names[pos], ValueDictionary()).code_table([v])[0]
+
+    def _schema(self, dm, descs, row):
+        schema = []
+        dict_columns = set()
+        for i, desc in enumerate(descs):
+            pos = self.out_index.get(desc["N"])
+            values = None
+            if "DN" in desc:
+                dict_columns.add(i)
+                if pos is not None and self.value_dicts is not None:
+                    values = self._value_dict(desc["DN"], pos)
+                elif pos is not None:
+                    self.deferred.setdefault(pos, []).append((row, desc["DN"]))
+            schema.append((i, desc["N"], values, pos))
+        level = self.schemas[dm] = (schema, dict_columns)
+        return level
+
+    def walk(self, blocks):
+        """Decode the rows under a PH or M list into the output columns."""
+        # output buffers grow once per call and are filled by row index
+        row = self.rows
+        n_rows = dsr_leaf_count(blocks)
+        for buffer in self.buffers:
+            buffer.extend(repeat(None, n_rows))
+        self.rows += n_rows
+        buffers = self.buffers
+        current = self.current
+
+        # explicit stack of row iterators, one per open DM level
+        stack = [(iter(rows), dm) for dm, rows in reversed(_dm_blocks(blocks))]
+        while stack:
+            rows, dm = stack[-1]
+            node = next(rows, None)
+            if node is None:
+                stack.pop()
+                continue
+
+            self.row(dm, node, row)
+            if "M" in node:
+                stack.extend((iter(rows), dm) for dm, rows in reversed(_dm_blocks(node["M"])))
+            else:
+                for buffer, v in zip(buffers, current):
+                    buffer[row] = v
+                row += 1
+
+    def row(self, dm, node, row):
+        """Decode one row of level `dm` into the current values; its "M"
+        levels, if any, are left to the caller. `row` is the output row
+        index the next leaf gets."""
+        current = self.current
+        if node.get("S"):
+            level = self._schema(dm, node["S"], row)
+        elif dm in self.schemas:
+            level = self.schemas[dm]
         else:
-            last_update = None
-
-        rows.append(
-            [
-                get("D0", C[0]),
-                get("D1", C[1]),
-                get("D2", C[2]),
-                get("D3", C[3]),
-                get("D4", C[4]),
-                get("D5", C[5]),
-                get("D6", C[6]),
-                get("D7", C[7]),
-                get("D8", 0),
-                get("D9", 0),
-                get("D10", 0),
-                last_update,
-            ]
-        )
+            level = self._schema(dm, self.default_schema, row)
+        schema, dict_columns = level
+        coded = self.dictionaries is not None
+
+        repeated = node.get(DSR_REPEAT, 0)
+        null = node.get(DSR_NULL, 0)
+        C = node.get("C")
+        start = 0
+        c = 0
+        omitted = ()
+        if C is not None:
+            if len(node) - (DSR_REPEAT in node) > 1:
+                # possibly named values: C starts after the last one
+                start = len(schema)
+                while start and schema[start - 1][1] not in node:
+                    start -= 1
+            flagged = (repeated | null) >> start
+            short = len(schema) - start - len(C)
+            if flagged:
+                short -= bin(flagged).count("1")
+            if short < 0:
+                if self.c_tail:
+                    c = -short
+                else:
+                    self._warn(f"DSR {dm} ROWS SEND {-short} VALUE(S) TOO MANY IN C: IGNORED")
+            elif short:
+                filled = [i for i in range(start, len(schema)) if not flagged >> (i - start) & 1]
+                omitted = [i for i in reversed(filled) if i in dict_columns][:short]
+
+        for i, name, values, pos in schema:
+            if name in node:
+                v = node[name]
+            elif C is None or i < start or repeated >> i & 1:
+                # not sent or repeated: unchanged from the previous row
+                continue
+            elif null >> i & 1:
+                v = None
+            elif c < len(C) and i not in omitted:
+                v = C[c]
+                c += 1
+            elif pos is None:
+                continue
+            elif i in omitted and self.value_dicts is None:
+                v = _LEFT_OUT
+                self.left_out.add(pos)
+            elif i in omitted and values is not None and len(values) == 1:
+                v = 0
+            else:
+                v = None
+                self._warn(f"DSR ROWS LEAVE {self.out_names[pos]} OUT OF C: DECODED AS None")
+
+            if values is not None and v is not None:
+                if v.__class__ is int:
+                    v = values[v] if 0 <= v < len(values) else None
+                elif coded:
+                    v = self._code(pos, v)
+            if pos is not None:
+                current[pos] = v
+
+    def append_row(self):
+        """Append the current values as one output row (a leaf)."""
+        for buffer, v in zip(self.buffers, self.current):
+            buffer.append(v)
+        self.rows += 1
+
+    def resolve(self, value_dicts):
+        """Resolve the ValueDicts indices left by walks without value_dicts."""
+        self.value_dicts = value_dicts
+        for pos, segments in self.deferred.items():
+            buffer = self.buffers[pos]
+            ends = [start for start, _ in segments[1:]] + [len(buffer)]
+            for (start, dn), end in zip(segments, ends):
+                values = self._value_dict(dn, pos)
+                if pos in self.left_out and (values is None or len(values) != 1):
+                    if any(v is _LEFT_OUT for v in buffer[start:end]):
+                        self._warn(f"DSR ROWS LEAVE {self.out_names[pos]} OUT OF C: DECODED AS None")
+                if values is None:
+                    if pos in self.left_out:
+                        buffer[start:end] = [None if v is _LEFT_OUT else v for v in buffer[start:end]]
+                    continue
+                n = len(values)
+                left_out = values[0] if n == 1 else None
+                coded = self.dictionaries is not None
+                buffer[start:end] = [
+                    (values[v] if 0 <= v < n else None) if v.__class__ is int
+                    else left_out if v is _LEFT_OUT
+                    else self._code(pos, v) if coded and v is not None
+                    else v
+                    for v in buffer[start:end]
+                ]
+        self.deferred = {}
+        self.left_out = set()
+
+    def columns(self):
+        return dict(zip(self.out_names, self.buffers))
+
+
+def decode_dsr(js, fields, dictionaries=None, dicts=None, c_tail=False):
+    """Decode a QES response into columns.
+
+    `fields` maps schema column names to output names, in output order; the
+    result holds one list per output name with one value per leaf row.
+    `dicts` maps dictionary-encoded columns to their ValueDicts entry for
+    levels sent without a schema. Dictionary-encoded values are resolved;
+    unknown indices decode to None. With a `dictionaries` dict they are
+    returned as integer codes into dictionaries[output name] instead, a
+    ValueDictionary added on first use. `c_tail` reads a C longer than
+    the columns it fills from its end."""
+    ds = dsr_dataset(js) or {}
+    walker = _DSRWalker(fields, ds.get("ValueDicts", {}), dictionaries, dicts, c_tail)
+    if ds.get("PH"):
+        walker.walk(ds["PH"])
+    return walker.columns()
+
+
+MILLIS_PER_DAY = 86400 * 1000
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_millis_dates(values):
+    """'YYYY-MM-DD' (UTC) for a column of epoch-millis values (None stays None).
+    Each distinct day is formatted once; no datetime per row."""
+    days = {}
+    dates = []
+    for v in values:
+        if v is None:
+            dates.append(None)
+            continue
+        day = int(v // MILLIS_PER_DAY)
+        text = days.get(day)
+        if text is None:
+            text = days[day] = date.fromordinal(_EPOCH_ORDINAL + day).isoformat()
+        dates.append(text)
+    return dates
+
+
+class DSRColumns:
+    """One section decoded column by column, over any number of pages.
+
+    Dictionary-encoded columns hold integer codes into `dictionaries[name]`.
+    `dates` names DateTime columns, kept as epoch millis (None when empty):
+    frame() and arrow() turn them into datetime columns in one pass, records()
+    and first() give 'YYYY-MM-DD' strings. `dicts` is the section's column ->
+    ValueDicts entry map for levels sent without a schema and `c_tail` its
+    long-C rule (see decode_dsr)."""
+
+    def __init__(self, fields, dates=(), dicts=None, c_tail=False):
+        self.fields = fields
+        self.dates = dates
+        self.dicts = dicts
+        self.c_tail = c_tail
+        self.columns = {name: [] for name in fields.values()}
+        self.dictionaries = {}
+
+    def extend(self, js):
+        """Append the rows of one response page."""
+        self._append(decode_dsr(js, self.fields, self.dictionaries, self.dicts, self.c_tail))
+        return self
+
+    def extend_stream(self, fp):
+        """Append the rows of one response page read from a binary stream;
+        returns the page's IC / RT paging flags."""
+        page, ds = stream_dsr(fp, self.fields, self.dictionaries, self.dicts, self.c_tail)
+        self._append(page)
+        return ds
+
+    def _append(self, page):
+        for name in self.dates:
+            page[name] = [v if v and v.__class__ in (int, float) else None for v in page[name]]
+        for name, values in page.items():
+            self.columns[name] += values
+
+    def append_empty(self):
+        """Append one row of None."""
+        for values in self.columns.values():
+            values.append(None)
+
+    def truncate(self, n):
+        """Keep the first `n` rows."""
+        for values in self.columns.values():
+            del values[n:]
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def values(self, name):
+        """Column `name` with dictionary codes resolved and dates formatted."""
+        values = self.columns[name]
+        if name in self.dates:
+            return epoch_millis_dates(values)
+        dictionary = self.dictionaries.get(name)
+        if dictionary is None:
+            return values
+        return [None if code is None else dictionary[code] for code in values]
+
+    def first(self, datetimes=False):
+        """First row as a dict; IndexError when there are no rows. With
+        `datetimes`, DateTime columns are naive UTC datetimes (to the
+        millisecond) instead of 'YYYY-MM-DD' strings."""
+        row = {}
+        for name, values in self.columns.items():
+            v = values[0]
+            dictionary = self.dictionaries.get(name)
+            if name in self.dates:
+                if not datetimes:
+                    v = epoch_millis_dates([v])[0]
+                elif v is not None:
+                    v = _EPOCH + timedelta(milliseconds=v)
+            elif dictionary is not None and v is not None:
+                v = dictionary[v]
+            row[name] = v
+        return row
+
+    def records(self):
+        names = list(self.columns)
+        return [dict(zip(names, row)) for row in zip(*(self.values(name) for name in names))]
+
+    def frame(self):
+        """DataFrame with a Categorical over the value dictionary per encoded column."""
+        import pandas as pd
+
+        data = {}
+        for name, values in self.columns.items():
+            dictionary = self.dictionaries.get(name)
+            if name in self.dates:
+                data[name] = pd.to_datetime(pd.Series(values, dtype="float64"), unit="ms")
+            elif dictionary is None:
+                data[name] = pd.Series(values, dtype=object)
+            else:
+                codes = [-1 if code is None else code for code in values]
+                data[name] = pd.Categorical.from_codes(codes, categories=dictionary)
+        return pd.DataFrame(data, columns=list(self.columns))
+
+    def arrow(self):
+        """pyarrow Table with a DictionaryArray per encoded column."""
+        import pyarrow as pa
+
+        arrays = []
+        for name, values in self.columns.items():
+            dictionary = self.dictionaries.get(name)
+            if name in self.dates:
+                arrays.append(pa.array(values, type=pa.int64()).cast(pa.timestamp("ms")))
+            elif dictionary is None:
+                arrays.append(pa.array(values))
+            else:
+                indices = pa.array(values, type=pa.int32())
+                arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(dictionary)))
+        return pa.table(arrays, names=list(self.columns))
+
+
+def section_view(columns, frame):
+    """DSRColumns as a DataFrame (frame=True), records (False), a pyarrow
+    Table ("arrow") or unchanged (None)."""
+    if frame is None:
+        return columns
+    if frame == "arrow":
+        return columns.arrow()
+    return columns.frame() if frame else columns.records()
+
+
+# ============================================================
+# STREAMING RESPONSES
+# ============================================================
+# With streaming on, paged section queries are decoded while the body
+# downloads: every DM<n> row, at any level of PH or M, is handed to the
+# decoder as soon as its own values are read and the document tree is never
+# built, so peak memory is about the decoded columns. A row's "M" must be its
+# last key (values sent after it are refused). ValueDicts usually follow PH, so dictionary columns keep their
+# indices until the end of the body. Needs ijson; responses stream only
+# when nothing else needs the whole body (cache, recording, replay and
+# multi-query batching are off).
+STREAM_RESPONSES = False
+
+_DS_PREFIX = "results.item.result.data.dsr.DS.item"
+_STREAM_PH = _DS_PREFIX + ".PH.item"
+_STREAM_PREFIXES = {_DS_PREFIX + ".ValueDicts", _DS_PREFIX + ".IC", _DS_PREFIX + ".RT"}
+
+
+def _ijson():
+    try:
+        import ijson
+    except ImportError:
+        return None
+    return ijson
+
+
+def configure_streaming(enabled=True):
+    global STREAM_RESPONSES
+    if enabled and _ijson() is None:
+        raise Exception("❌ STREAMING NEEDS ijson (pip install ijson)")
+    STREAM_RESPONSES = enabled
+
+
+def streaming_active():
+    return (
+        STREAM_RESPONSES
+        and _response_cache is None
+        and _query_batcher is None
+        and not RECORD_DIR
+        and not REPLAY_DIR
+    )
+
+
+def _stream_value(events, event, value):
+    # the complete JSON value starting with (event, value)
+    if event not in ("start_map", "start_array"):
+        return value
+    builder = _ijson().ObjectBuilder()
+    builder.event(event, value)
+    depth = 1
+    for _, event, value in events:
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+            if not depth:
+                break
+    return builder.value
+
+
+def stream_dsr(fp, fields, dictionaries=None, dicts=None, c_tail=False):
+    """decode_dsr() for a single-query response body read from the binary
+    stream `fp`. Returns the columns and the DS paging flags ("IC", "RT")."""
+    walker = _DSRWalker(fields, None, dictionaries, dicts, c_tail)
+    ds = {}
+    blocks = {_STREAM_PH}  # prefixes of PH / M items ({"DM<n>": [rows]})
+    levels = {}  # prefix of the rows of a DM<n> list -> "DM<n>"
+    open_rows = []  # [prefix, DM name, values so far, decoded] per open level
+
+    events = _ijson().parse(fp, use_float=True)
+    for prefix, event, value in events:
+        if event == "map_key":
+            if prefix in blocks:
+                if not value.startswith("DM"):
+                    raise Exception(f"❌ UNEXPECTED DSR BLOCK KEY: {value}")
+                levels[f"{prefix}.{value}.item"] = value
+            elif open_rows and prefix == open_rows[-1][0]:
+                level = open_rows[-1]
+                if value == "M":
+                    # the row's own values are all in: decode it before its children
+                    walker.row(level[1], level[2], walker.rows)
+                    level[3] = True
+                    blocks.add(prefix + ".M.item")
+                elif level[3]:
+                    raise Exception(f"❌ DSR ROW SENDS {value} AFTER ITS M LEVELS: CANNOT STREAM")
+                else:
+                    _, event, v = next(events)
+                    level[2][value] = _stream_value(events, event, v)
+        elif event == "start_map" and prefix in levels:
+            open_rows.append([prefix, levels[prefix], {}, False])
+        elif event == "end_map" and open_rows and prefix == open_rows[-1][0]:
+            _, dm, node, decoded = open_rows.pop()
+            if not decoded:
+                walker.row(dm, node, walker.rows)
+                walker.append_row()
+        elif prefix in _STREAM_PREFIXES:
+            ds[prefix.rpartition(".")[2]] = _stream_value(events, event, value)
+
+    walker.resolve(ds.pop("ValueDicts", {}))
+    return walker.columns(), ds
+
+
+def query_columns(columns, payload, label="", version=None, ttl=None):
+    """Decode every page of a paged query into the DSRColumns `columns`."""
+    if not streaming_active():
+        for js in iter_query_pages(payload, label, version, ttl):
+            with stage("decode"):
+                columns.extend(js)
+        return columns
+
+    for _ in range(MAX_PAGES):
+        with post_with_auto_token(URL, headers=BASE_HEADERS, json=payload, stream=True) as res:
+            if res.status_code != 200:
+                raise Exception(f"❌ ERROR{' ' + label if label else ''}: {res.text}")
+            res.raw.decode_content = True
+            with stage("decode"):
+                ds = columns.extend_stream(res.raw)
+
+        if not ds.get("IC") or not ds.get("RT"):
+            return columns
+
+        payload = _with_restart_tokens(payload, ds["RT"])
+
+    print(f"⚠️ {label or 'SC HEADER'} RESULT TRUNCATED AFTER {MAX_PAGES} PAGES")
+    return columns
+
+
+# Open the HTML file in a headless browser and save a full-page screenshot
+async def _screenshot_page(context, html_path, output_png):
+    page = await context.new_page()
+
+    await page.goto(
+        "file://" + os.path.abspath(html_path),
+        wait_until="networkidle"
+    )
+
+    await page.screenshot(
+        path=output_png,
+        full_page=True
+    )
 
-    return rows
-
-
-
-# DATAFRAME
-rows = decode(js)
-df_sc = pd.DataFrame(
-    rows,
-    columns=[
-        "Certification Body",
-        "Certified Organization Name",
-        "TE ID",
-        "Retired TE ID",
-        "License Number",
-        "Native Name",
-        "Country/Area",
-        "SC Number",
-        "SC Version Number",
-        "Standard",
-        "SC Status",
-        "LastUpdated_Timestamp",
-    ],
-)
 
-print("✅ SC HEADER DATA EXTRACTED SUCCESSFULLY")
+def screenshot_html(html_path, output_png):
+    browser_manager().run(
+        _screenshot_page,
+        html_path,
+        output_png,
+        context_options={
+            "viewport": {"width": 1400, "height": 900},
+            "device_scale_factor": 2,
+        },
+    )
+
+
+# ------------------------------------------------------------
+# LITERALS
+# ------------------------------------------------------------
+def _isna(v):
+    # pd.isna() for a scalar; pandas only has to be loaded if a value came from it
+    if v is None:
+        return True
+    if isinstance(v, float):
+        return v != v
+    # a module still being imported by another thread has not produced any values yet
+    isna = getattr(sys.modules.get("pandas"), "isna", None)
+    return isna is not None and bool(isna(v))
+
+
+def _lit_text(v):
+    # dates (incl. datetime / pd.Timestamp from a frame) as the 'YYYY-MM-DD' records carry
+    return v.strftime("%Y-%m-%d") if isinstance(v, date) else v
 
-# First SC result row
-row = df_sc.iloc[0]
 
 def lit(v):
     # Null value
-    if v is None or pd.isna(v) or v == "null":
+    if _isna(v) or v == "null":
         return "null"
 
     # Empty string
@@ -423,2986 +1680,856 @@ def lit(v):
         return "''"
     
     # Normal value
-    return f"'{v}'"
+    return f"'{_lit_text(v)}'"
 
 
 def lit_date(v):
-    if pd.isna(v) or v in ["", None, "null"]:
+    if _isna(v) or v in ["", None, "null"]:
         return "null"
-    return f"datetime'{v}T00:00:00'"
+    return f"datetime'{_lit_text(v)}T00:00:00'"
 
 
-# ============================================================
-# PRODUCT
-# ============================================================
+def lit_P(v):
+    if _isna(v) or v in ["", None, "null"]:
+        return "null"
+    return f"'{_lit_text(v)}'"
 
-payload_products = {
-    "version": "1.0.0",
-    "allowLongRunningQueries": True,
-    "modelId": 4668616,
-    "queries": [
-        {
-            "QueryId": "",
-            "userPreferredLocale": "en",
-            "ApplicationContext": {
-                "DatasetId": "30385b55-d526-401d-8379-6a502d67c719",
-                "Sources": [
-                    {
-                        "ReportId": "5bbb73cf-c2c7-4c8d-8461-f04b75a9438b",
-                        "VisualId": "637e2cd9d391deed6466",
-                    }
-                ],
-            },
-            "Query": {
-                "Commands": [
-                    {
-                        "SemanticQueryDataShapeCommand": {
-                            "ExecutionMetricsKind": 1,
-                            "Query": {
-                                "Version": 2,
-                                "From": [
-                                    {
-                                        "Name": "s1",
-                                        "Entity": "semantic vw_facility",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s2",
-                                        "Entity": "semantic vw_Products",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s11",
-                                        "Entity": "semantic vw_ScopeCertificate_SuppyChainOperator",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s21",
-                                        "Entity": "semantic vw_ScopeCertificateStandard",
-                                        "Type": 0,
-                                    },
-                                ],
-                                "Select": [
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Product_Category_Desc",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Product_Category_Code",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Product_Detail_Desc",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Product_Detail_Code",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Raw Matetrial Description",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Raw_Material_Percentage",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "Facility Name",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Raw_Material_Code",
-                                        }
-                                    },
-                                ],
-                        
-                                "Where": [
-                                    
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s1"
-                                                                }
-                                                            },
-                                                            "Property": "facility_type",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": "'Subsequent'"
-                                                            }
-                                                        }
-                                                    ],
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": "'Main Facility'"
-                                                            }
-                                                        }
-                                                    ],
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certified Organization Name"].replace("'", "''")
-                                                                    
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Country",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Country/Area"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_License",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "License Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Native_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": (
-                                                                    "''"
-                                                                    if row[
-                                                                        "Native Name"
-                                                                    ]
-                                                                    == ""
-                                                                    else lit(
-                                                                        row[
-                                                                            "Native Name"
-                                                                        ]
-                                                                    )
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Number",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Number"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Status",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Status"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "Retired_CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Retired TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s21"
-                                                                }
-                                                            },
-                                                            "Property": "Grouped SC Standard",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Standard"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "Contains": {
-                                                "Left": {
-                                                    "Column": {
-                                                        "Expression": {
-                                                            "SourceRef": {
-                                                                "Source": "s11"
-                                                            }
-                                                        },
-                                                        "Property": "SC Number | SC Version No",
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Literal": {
-                                                        "Value": lit(row["SC Number"])
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "CB_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certification Body"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Version_No",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "SC Version Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s11"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Last_Updated_Date",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit_date(
-                                                                    row[
-                                                                        "LastUpdated_Timestamp"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "And": {
-                                                "Left": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s11"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU1163654MUL-2023-00034573'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s11"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU807457MUL-2024-00115951'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "Not": {
-                                                "Expression": {
-                                                    "Comparison": {
-                                                        "ComparisonKind": 0,
-                                                        "Left": {
-                                                            "Column": {
-                                                                "Expression": {
-                                                                    "SourceRef": {
-                                                                        "Source": "s11"
-                                                                    }
-                                                                },
-                                                                "Property": "CB_Code",
-                                                            }
-                                                        },
-                                                        "Right": {
-                                                            "Literal": {
-                                                                "Value": "'CB-DCB'"
-                                                            }
-                                                        },
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "And": {
-                                                "Left": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s11"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU807457RAF-2024-000801115'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s11"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU1042889MUL-2024-00027504'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                ], 
-                            },
-                            "Binding": {
-                                "Primary": {
-                                    "Groupings": [
-                                        {"Projections": [6], "Subtotal": 0},
-                                        {"Projections": [1], "Subtotal": 0},
-                                        {"Projections": [0], "Subtotal": 0},
-                                        {"Projections": [3], "Subtotal": 0},
-                                        {"Projections": [2], "Subtotal": 0},
-                                        {"Projections": [7], "Subtotal": 0},
-                                        {"Projections": [4], "Subtotal": 0},
-                                        {"Projections": [5], "Subtotal": 0},
-                                    ]
-                                },
-                                "DataReduction": {
-                                    "DataVolume": 3,
-                                    "Primary": {"Window": {"Count": 500}},
-                                },
-                                "Version": 1,
-                            },
-                        }
-                    }
-                ]
-            },
-        }
-    ],
-}
+
+def lit_quoted(v):
+    # lit() with embedded single quotes doubled
+    return lit(v.replace("'", "''"))
 
 
-# REQUEST
-print("\n📡 Fetching PRODUCT DATA...")
+# ============================================================
+# QUERY TEMPLATES
+# ============================================================
+# Every query is declared as a compact spec: the report visual, the entities
+# it reads ("alias": "view"), the selected columns ("alias.Property") and the
+# Where conditions, whose per-SC literals are Slot()s. A spec is compiled
+# once, on first use, into canonical (sorted-key, compact) JSON text split
+# around its slots; building a payload only formats the slot literals and
+# joins the pieces, and the resulting text is what gets hashed and POSTed.
+MODEL_ID = 4668616
+DATASET_ID = "30385b55-d526-401d-8379-6a502d67c719"
+REPORT_ID = "5bbb73cf-c2c7-4c8d-8461-f04b75a9438b"
 
-res_prod = post_with_auto_token(URL, headers=BASE_HEADERS, json=payload_products)
+PAYLOAD_ENVELOPE = {"version": "1.0.0", "allowLongRunningQueries": True, "modelId": MODEL_ID}
 
-if res_prod.status_code != 200:
-    print("❌ ERROR PRODUCT:", res_prod.text)
-    exit()
 
-js_prod = res_prod.json()
+_canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"), ensure_ascii=False)
 
 
-# ==========================================
-# DECODE PRODUCTS 
-# ==========================================
+def _canonical(obj):
+    return _canonical_encoder.encode(obj)
 
-def extract_products(js):
 
-    ds = js["results"][0]["result"]["data"]["dsr"]["DS"][0]
-    vd = ds["ValueDicts"]
+class Slot:
+    """A per-SC literal: `path` is "row.<column>", "facility.<column>" or a
+    plain build() keyword, `fmt` turns the value into a query literal."""
 
-    def vdict(name, idx):
-        try:
-            return vd[name][idx]
-        except:
-            return None
+    def __init__(self, path, fmt=lit):
+        self.source, _, self.key = path.partition(".")
+        self.fmt = fmt
 
-    rows = []
+    def value(self, sources):
+        value = sources[self.source]
+        return self.fmt(value[self.key] if self.key else value)
 
-    
-    last = {
-        "facility": None,
-        "cat_code": None,
-        "cat_desc": None,
-        "detail_code": None,
-        "detail_desc": None,
-        "raw_code": None,
-        "raw_desc": None,
-        "raw_pct": None,
-    }
 
-    def walk(node, ctx):
-        nonlocal last
-        ctx = ctx.copy()
-
-        # FACILITY
-        if "G0" in node:
-            val = node["G0"]
-            ctx["facility"] = val
-            last["facility"] = val
-
-        # CATEGORY
-        if "G1" in node:
-            val = vdict("D0", node["G1"])
-            ctx["cat_code"] = val
-            last["cat_code"] = val
-
-        if "G2" in node:
-            val = vdict("D1", node["G2"])
-            ctx["cat_desc"] = val
-            last["cat_desc"] = val
-
-        # DETAIL
-        if "G3" in node:
-            val = vdict("D2", node["G3"])
-            ctx["detail_code"] = val
-            last["detail_code"] = val
-
-        if "G4" in node:
-            val = vdict("D3", node["G4"])
-            ctx["detail_desc"] = val
-            last["detail_desc"] = val
-
-        # RAW MATERIAL
-        if "G5" in node:
-            val = vdict("D4", node["G5"])
-            ctx["raw_code"] = val
-            last["raw_code"] = val
-
-        # RAW DESC
-        if "G6" in node:
-            val = vdict("D5", node["G6"])
-            ctx["raw_desc"] = val
-            last["raw_desc"] = val
-
-        # RAW %
-        if "G7" in node:
-            val = vdict("D6", node["G7"])
-            ctx["raw_pct"] = val
-            last["raw_pct"] = val
-
-     
-        if node.get("R") == 1:
-            ctx.update(last)
-
-
-        if "M" not in node:
-            rows.append(
-                    {
-                        "Facility Name": last["facility"],
-                        "Product Category Code": last["cat_code"],
-                        "Product Category Description": last["cat_desc"],
-                        "Product Detail Code": last["detail_code"],
-                        "Product Detail Description": last["detail_desc"],
-                        "Raw Material Code": last["raw_code"],
-                        "Raw Material Description": last["raw_desc"],
-                        "Raw Material Percentage": last["raw_pct"],
-                    }
-                )
-            return
+class _Hole:
+    def __init__(self, index):
+        self.index = index
 
 
-        for block in node["M"]:
-            for dm, children in block.items():  
-                for child in children:
-                    walk(child, ctx)
+class QueryPayload(dict):
+    """A built payload that carries its canonical JSON text.
 
+    Treat it as read-only: copy.deepcopy() returns a plain dict, which is
+    what paging and batching modify."""
 
-    for root in ds["PH"][0]["DM0"]:
-        walk(root, {})
+    def __init__(self, data, text, query_texts):
+        super().__init__(data)
+        self.text = text
+        self.query_texts = query_texts
 
-    return rows
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
 
 
-rows = extract_products(js_prod)
+def payload_text(payload):
+    """Canonical JSON text of a payload, pre-serialized when it was built from a template."""
+    text = getattr(payload, "text", None)
+    return text if text is not None else _canonical(payload)
 
-df = pd.DataFrame(rows)
 
-df = df.rename(
-    columns={
-        "facility": "Facility Name",
-        "cat_code": "Product Category Code",
-        "cat_desc": "Product Category Description",
-        "detail_code": "Product Detail Code",
-        "detail_desc": "Product Detail Description",
-        "raw_code": "Raw Material Code",
-        "raw_desc": "Raw Material Description",
-        "percentage": "Raw Material Percentage",
-    }
-)
+def payload_body(payload):
+    """UTF-8 request body: the pre-serialized text of a templated payload,
+    otherwise the JSON codec's encoding (which need not match payload_text)."""
+    text = getattr(payload, "text", None)
+    return text.encode("utf-8") if text is not None else json_codec().dumps(payload)
 
-df_products = df[
-    [
-        "Facility Name",
-        "Product Category Code",
-        "Product Category Description",
-        "Product Detail Code",
-        "Product Detail Description",
-        "Raw Material Code",
-        "Raw Material Description",
-        "Raw Material Percentage",
-    ]
-]
 
+def merge_payloads(payloads):
+    """One payload carrying the queries of all `payloads` (same envelope)."""
+    merged = dict(payloads[0])
+    merged["queries"] = [q for p in payloads for q in p["queries"]]
+    if not all(isinstance(p, QueryPayload) for p in payloads):
+        return merged
 
-print("✅ Product DATA EXTRACTED SUCCESSFULLY")
+    query_texts = [t for p in payloads for t in p.query_texts]
+    envelope = _canonical(dict(merged, queries=[]))
+    text = envelope.replace('"queries":[]', '"queries":[' + ",".join(query_texts) + "]", 1)
+    return QueryPayload(merged, text, query_texts)
 
-# First Product row
-row_prod = df_products.iloc[0]
 
+def _column(ref, sources, named=False, native=None):
+    alias, _, prop = ref.partition(".")
+    item = {"Column": {"Expression": {"SourceRef": {"Source": alias}}, "Property": prop}}
+    if named:
+        item["Name"] = f"semantic {sources[alias]}.{prop}"
+    if native:
+        item["NativeReferenceName"] = native
+    return item
 
-def lit_P(v):
-    if pd.isna(v) or v in ["", None, "null"]:
-        return "null"
-    return f"'{v}'"
 
+def _select_item(entry, sources, named):
+    # "alias.Property", ("alias.Property", native name) or "min:alias.Property"
+    if isinstance(entry, tuple):
+        return _column(entry[0], sources, named, entry[1])
+    if entry.startswith("min:"):
+        ref = entry[4:]
+        alias, _, prop = ref.partition(".")
+        return {
+            "Aggregation": {"Expression": _column(ref, sources), "Function": 3},
+            "Name": f"Min(semantic {sources[alias]}.{prop})",
+        }
+    return _column(entry, sources, named)
+
+
+def _literal(value):
+    return {"Literal": {"Value": value}}
+
+
+def _condition(cond, sources):
+    # ("in", col, *values) | ("contains", col, value) | ("eq", col, value)
+    # | ("not_eq", col, value) | ("and", cond, cond)
+    kind = cond[0]
+    if kind == "and":
+        return {"And": {"Left": _condition(cond[1], sources), "Right": _condition(cond[2], sources)}}
+    if kind == "in":
+        return {"In": {"Expressions": [_column(cond[1], sources)], "Values": [[_literal(v)] for v in cond[2:]]}}
+    if kind == "contains":
+        return {"Contains": {"Left": _column(cond[1], sources), "Right": _literal(cond[2])}}
+
+    comparison = {"Comparison": {"ComparisonKind": 0, "Left": _column(cond[1], sources), "Right": _literal(cond[2])}}
+    if kind == "eq":
+        return comparison
+    if kind == "not_eq":
+        return {"Not": {"Expression": comparison}}
+    raise ValueError(f"unknown condition {kind!r}")
+
+
+class QueryTemplate:
+    def __init__(
+        self,
+        visual,
+        sources,
+        select,
+        where,
+        groupings,
+        named=False,
+        locale=None,
+        metrics=False,
+        subtotal=False,
+        show_items=False,
+    ):
+        self.spec = dict(
+            visual=visual,
+            sources=sources,
+            select=select,
+            where=where,
+            groupings=groupings,
+            named=named,
+            locale=locale,
+            metrics=metrics,
+            subtotal=subtotal,
+            show_items=show_items,
+        )
+        self._compiled = None
+
+    def query(self):
+        """The query object, with Slot()s where the per-SC literals go."""
+        s = self.spec
+        sources = s["sources"]
+
+        groupings = []
+        for projections in s["groupings"]:
+            grouping = {"Projections": projections}
+            if s["subtotal"]:
+                grouping["Subtotal"] = 0
+            if s["show_items"]:
+                grouping["ShowItemsWithNoData"] = projections
+            groupings.append(grouping)
+
+        command = {
+            "Query": {
+                "Version": 2,
+                "From": [{"Name": alias, "Entity": f"semantic {view}", "Type": 0} for alias, view in sources.items()],
+                "Select": [_select_item(entry, sources, s["named"]) for entry in s["select"]],
+                "Where": [{"Condition": _condition(cond, sources)} for cond in s["where"]],
+            },
+            "Binding": {
+                "Primary": {"Groupings": groupings},
+                "DataReduction": {"DataVolume": 3, "Primary": {"Window": {"Count": 500}}},
+                "Version": 1,
+            },
+        }
+        if s["metrics"]:
+            command["ExecutionMetricsKind"] = 1
 
-# -----------------------------
-# Facility
-# -----------------------------
-payload_Facility = {
-    "version": "1.0.0",
-    "allowLongRunningQueries": True,
-    "modelId": 4668616,
-    "queries": [
-        {
+        query = {
             "QueryId": "",
-            "userPreferredLocale": "en",
             "ApplicationContext": {
-                "DatasetId": "30385b55-d526-401d-8379-6a502d67c719",
-                "Sources": [
-                    {
-                        "ReportId": "5bbb73cf-c2c7-4c8d-8461-f04b75a9438b",
-                        "VisualId": "9dcd0600752094910de4",
-                    }
-                ],
-            },
-            "Query": {
-                "Commands": [
-                    {
-                        "SemanticQueryDataShapeCommand": {
-                            "ExecutionMetricsKind": 1,
-                            "Query": {
-                                "Version": 2,
-                                "From": [
-                                    {
-                                        "Name": "s1",
-                                        "Entity": "semantic vw_facility",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s2",
-                                        "Entity": "semantic vw_FacilityStandard",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s3",
-                                        "Entity": "semantic vw_Process",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s",
-                                        "Entity": "semantic vw_ScopeCertificate_SuppyChainOperator",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s21",
-                                        "Entity": "semantic vw_ScopeCertificateStandard",
-                                        "Type": 0,
-                                    },
-                                ],
-                    
-                                "Select": [
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "facility_type",
-                                        },
-                                        "Name": "semantic vw_facility.facility_type",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Facility_Standard_Name",
-                                        },
-                                        "Name": "semantic vw_FacilityStandard.Facility_Standard_Name",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s3"}
-                                            },
-                                            "Property": "Process_Category_Code",
-                                        },
-                                        "Name": "semantic vw_Process.Process_Category_Code",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s3"}
-                                            },
-                                            "Property": "Process_Category_Description",
-                                        },
-                                        "Name": "semantic vw_Process.Process_Category_Description",
-                                    },
-                                    {
-                                        "Aggregation": {
-                                            "Expression": {
-                                                "Column": {
-                                                    "Expression": {
-                                                        "SourceRef": {"Source": "s"}
-                                                    },
-                                                    "Property": "CB_Code",
-                                                }
-                                            },
-                                            "Function": 3,
-                                        },
-                                        "Name": "Min(semantic vw_ScopeCertificate_SuppyChainOperator.CB_Code)",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "TE ID",
-                                        },
-                                        "Name": "semantic vw_facility.TE ID",
-                                        "NativeReferenceName": "TE ID",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "Retired TE ID",
-                                        },
-                                        "Name": "semantic vw_facility.Retired TE ID",
-                                        "NativeReferenceName": "Retired TE ID",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "Facility Name",
-                                        },
-                                        "Name": "semantic vw_facility.Facility Name",
-                                        "NativeReferenceName": "Name",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "Facility Address",
-                                        },
-                                        "Name": "semantic vw_facility.Facility Address",
-                                        "NativeReferenceName": "Address",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "Facility Country",
-                                        },
-                                        "Name": "semantic vw_facility.Facility Country",
-                                        "NativeReferenceName": "Country/Area",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "Facility State",
-                                        },
-                                        "Name": "semantic vw_facility.Facility State",
-                                        "NativeReferenceName": "State/Province",
-                                    },
-                                ],
-                        
-                                "Where": [
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s1"
-                                                                }
-                                                            },
-                                                            "Property": "facility_type",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": "'Main Facility'"
-                                                            }
-                                                        }
-                                                    ],
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": "'Subsequent'"
-                                                            }
-                                                        }
-                                                    ],
-                                                ],
-                                            }
-                                        }
-                                    },
-                        
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certified Organization Name"].replace("'", "''")
-                                                                    
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                               
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Country",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Country/Area"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                 
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_License",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "License Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                 
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Native_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Native Name"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                               
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Number",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Number"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                        
-                                    {
-                                        "Condition": {
-                                            "Contains": {
-                                                "Left": {
-                                                    "Column": {
-                                                        "Expression": {
-                                                            "SourceRef": {"Source": "s"}
-                                                        },
-                                                        "Property": "SC Number | SC Version No",
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Literal": {
-                                                        "Value": lit(row["SC Number"])
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                      
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Status",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Status"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                        
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "CB_Name",
-                                                        }
-                                                    },
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certification Body"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                      
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "Retired_CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Retired TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Version_No",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "SC Version Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s21"
-                                                                }
-                                                            },
-                                                            "Property": "Grouped SC Standard",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Standard"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Last_Updated_Date",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit_date(
-                                                                    row[
-                                                                        "LastUpdated_Timestamp"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "And": {
-                                                "Left": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU1163654MUL-2023-00034573'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU807457MUL-2024-00115951'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "Not": {
-                                                "Expression": {
-                                                    "Comparison": {
-                                                        "ComparisonKind": 0,
-                                                        "Left": {
-                                                            "Column": {
-                                                                "Expression": {
-                                                                    "SourceRef": {
-                                                                        "Source": "s"
-                                                                    }
-                                                                },
-                                                                "Property": "CB_Code",
-                                                            }
-                                                        },
-                                                        "Right": {
-                                                            "Literal": {
-                                                                "Value": "'CB-DCB'"
-                                                            }
-                                                        },
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "And": {
-                                                "Left": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU807457RAF-2024-000801115'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Not": {
-                                                        "Expression": {
-                                                            "Comparison": {
-                                                                "ComparisonKind": 0,
-                                                                "Left": {
-                                                                    "Column": {
-                                                                        "Expression": {
-                                                                            "SourceRef": {
-                                                                                "Source": "s"
-                                                                            }
-                                                                        },
-                                                                        "Property": "SC_Number",
-                                                                    }
-                                                                },
-                                                                "Right": {
-                                                                    "Literal": {
-                                                                        "Value": "'CU1042889MUL-2024-00027504'"
-                                                                    }
-                                                                },
-                                                            }
-                                                        }
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                ],  #
-                            },
-                            "Binding": {
-                                "Primary": {
-                                    "Groupings": [
-                                        {"Projections": [0]},
-                                        {"Projections": [7]},
-                                        {"Projections": [5]},
-                                        {"Projections": [6]},
-                                        {"Projections": [8]},
-                                        {"Projections": [10]},
-                                        {"Projections": [9]},
-                                        {"Projections": [1]},
-                                        {"Projections": [2]},
-                                        {"Projections": [3, 4]},
-                                    ]
-                                },
-                                "DataReduction": {
-                                    "DataVolume": 3,
-                                    "Primary": {"Window": {"Count": 500}},
-                                },
-                                "Version": 1,
-                            },
-                        }
-                    }
-                ]
+                "DatasetId": DATASET_ID,
+                "Sources": [{"ReportId": REPORT_ID, "VisualId": s["visual"]}],
             },
+            "Query": {"Commands": [{"SemanticQueryDataShapeCommand": command}]},
         }
+        if s["locale"]:
+            query["userPreferredLocale"] = s["locale"]
+        return query
+
+    def _compile(self):
+        slots = []
+        filled = {}  # id of each container a slot sits under -> keys leading to it
+
+        def mark(node):
+            if isinstance(node, Slot):
+                slots.append(node)
+                return _Hole(len(slots) - 1)
+            if isinstance(node, dict):
+                node = {k: mark(v) for k, v in node.items()}
+                items = node.items()
+            elif isinstance(node, list):
+                node = [mark(v) for v in node]
+                items = enumerate(node)
+            else:
+                return node
+            keys = [k for k, v in items if isinstance(v, _Hole) or id(v) in filled]
+            if keys:
+                filled[id(node)] = keys
+            return node
+
+        skeleton = mark(self.query())
+
+        text = json.dumps(
+            skeleton,
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=lambda hole: f"\x00slot{hole.index}\x00",
+        )
+        parts = []
+        for i in range(len(slots)):
+            head, text = text.split(_canonical(f"\x00slot{i}\x00"), 1)
+            parts.append(head)
+        parts.append(text)
+
+        envelope = _canonical(dict(PAYLOAD_ENVELOPE, queries=[]))
+        prefix, suffix = envelope.split('"queries":[]', 1)
+        self._compiled = (slots, parts, skeleton, filled, prefix + '"queries":[', "]" + suffix)
+        return self._compiled
+
+    def build(self, **sources):
+        slots, parts, skeleton, filled, prefix, suffix = self._compiled or self._compile()
+        literals = [slot.value(sources) for slot in slots]
+
+        pieces = [parts[0]]
+        for literal, part in zip(literals, parts[1:]):
+            pieces.append(_canonical(literal))
+            pieces.append(part)
+        query_text = "".join(pieces)
+
+        # only the containers leading to a slot are copied, the rest is shared
+        def fill(node):
+            if isinstance(node, _Hole):
+                return literals[node.index]
+            copied = node.copy()
+            for k in filled[id(node)]:
+                copied[k] = fill(node[k])
+            return copied
+
+        data = dict(PAYLOAD_ENVELOPE, queries=[fill(skeleton)])
+        return QueryPayload(data, prefix + query_text + suffix, [query_text])
+
+
+def excluded_sc_conditions(alias):
+    """SCs and the CB the report itself filters out of the product and facility visuals."""
+    return [
+        (
+            "and",
+            ("not_eq", f"{alias}.SC_Number", "'CU1163654MUL-2023-00034573'"),
+            ("not_eq", f"{alias}.SC_Number", "'CU807457MUL-2024-00115951'"),
+        ),
+        ("not_eq", f"{alias}.CB_Code", "'CB-DCB'"),
+        (
+            "and",
+            ("not_eq", f"{alias}.SC_Number", "'CU807457RAF-2024-000801115'"),
+            ("not_eq", f"{alias}.SC_Number", "'CU1042889MUL-2024-00027504'"),
+        ),
+    ]
+
+
+# ------------------------------------------------------------
+# SC Header Table
+# ------------------------------------------------------------
+
+HEADER_QUERY = QueryTemplate(
+    visual="8c0cdf793984740d7703",
+    sources={"s1": "vw_ScopeCertificate_SuppyChainOperator", "s": "vw_ScopeCertificateStandard"},
+    select=[
+        "s1.CB_Name",
+        "s1.SCO_Name",
+        "s1.CO_Te_Id",
+        "s1.Retired_CO_Te_Id",
+        "s1.SCO_License",
+        "s1.SCO_Native_Name",
+        "s1.SCO_Country",
+        "s1.SC_Number",
+        "s1.SC_Version_No",
+        "s.Grouped SC Standard",
+        "s1.SC_Status",
+        "s1.SC_Last_Updated_Date",
+    ],
+    where=[
+        ("contains", "s1.SC Number | SC Version No", Slot("sc_number")),
     ],
+    groupings=[[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]],
+)
+
+
+def build_header_payload(sc_number):
+    return HEADER_QUERY.build(sc_number=sc_number)
+
+
+# ==========================================
+# DECODE SC Header Table
+# ==========================================
+
+SC_HEADER_FIELDS = {
+    "G0": "Certification Body",
+    "G1": "Certified Organization Name",
+    "G2": "TE ID",
+    "G3": "Retired TE ID",
+    "G4": "License Number",
+    "G5": "Native Name",
+    "G6": "Country/Area",
+    "G7": "SC Number",
+    "G8": "SC Version Number",
+    "G9": "Standard",
+    "G10": "SC Status",
+    "G11": "LastUpdated_Timestamp",
 }
 
-# request
-print("\n📡 Fetching FACILITY DATA...")
 
+SC_HEADER_DATES = ("LastUpdated_Timestamp",)
+# ValueDicts entry of each dictionary-encoded column, for rows sent without a schema
+SC_HEADER_DICTS = {f"G{i}": f"D{i}" for i in range(11)}
 
-res_fac = post_with_auto_token(URL, headers=BASE_HEADERS, json=payload_Facility)
 
+def decode(js):
+    return DSRColumns(SC_HEADER_FIELDS, SC_HEADER_DATES, SC_HEADER_DICTS).extend(js).records()
 
-if res_fac.status_code != 200:
-    print("❌ ERROR FACILITY:", res_fac.text)
-    exit()
 
-js_fac = res_fac.json()
+class SCNotFoundError(Exception):
+    pass
 
 
-# ==========================================================
-# DECODE Facility Data
-# ==========================================================
-def extract_facilities(js):
+SC_HEADER_COLUMNS = list(SC_HEADER_FIELDS.values())
 
-    ds = js["results"][0]["result"]["data"]["dsr"]["DS"][0]
-    vd = ds["ValueDicts"]
-    PH = ds["PH"][0]
 
-    def vdict(name, idx):
-        try:
-            return vd[name][idx]
-        except:
-            return None
-
-    rows = []
-
-    last = {
-        "facility_type": None,
-        "facility_name": None,
-        "te_id": None,
-        "retired_te_id": None,
-        "address": None,
-        "state": None,
-        "country": None,
-        "standard": None,
-        "process_category_code": None,
-        "process_category_description": None,
-        "cb_code": None,
-    }
+def fetch_sc_header(sc_number, frame=True):
+    log("\n📡 Fetching SC Header Table...")
 
-    gmap = {
-        "G0": ("facility_type", None),
-        "G1": ("facility_name", "D0"),
-        "G2": ("te_id", "D1"),
-        "G3": ("retired_te_id", "D2"),
-        "G4": ("address", "D3"),
-        "G5": ("state", "D4"),
-        "G6": ("country", "D5"),
-        "G7": ("standard", "D6"),
-        "G8": ("process_category_code", "D7"),
-    }
+    if not sc_number:
+        raise SCNotFoundError("❌ SC NOT FOUND: empty SC number")
 
-    def walk(node, ctx):
-        nonlocal last
-        ctx = ctx.copy()
+    # unknown numbers seen recently are rejected before any token or network work
+    if _not_found_cache is not None and _not_found_cache.is_not_found(sc_number):
+        raise SCNotFoundError(f"❌ SC NOT FOUND: {sc_number} (cached)")
 
-        
-        for gx, (field, dict_name) in gmap.items():
-            if gx in node:
-                raw = node[gx]
-                if isinstance(raw, str) or dict_name is None:
-                    val = raw
-                else:
-                    val = vdict(dict_name, raw)
-                ctx[field] = val
-                last[field] = val
+    columns = DSRColumns(SC_HEADER_FIELDS, SC_HEADER_DATES, SC_HEADER_DICTS)
+    query_columns(columns, build_header_payload(sc_number), ttl=SC_HEADER_CACHE_TTL)
 
-        
-        if node.get("R") == 1:
-            ctx.update(last)
+    if not len(columns):
+        if _not_found_cache is not None:
+            _not_found_cache.mark_not_found(sc_number)
+        raise SCNotFoundError(f"❌ SC NOT FOUND: {sc_number}")
 
+    log("✅ SC HEADER DATA EXTRACTED SUCCESSFULLY")
+    return section_view(columns, frame)
 
-        if "C" in node:
-            pr = last.get("process_category_code")
-            C = node["C"]
 
-            if pr:
+# ============================================================
+# PRODUCT
+# ============================================================
 
+PRODUCTS_QUERY = QueryTemplate(
+    visual="637e2cd9d391deed6466",
+    sources={
+        "s1": "vw_facility",
+        "s2": "vw_Products",
+        "s11": "vw_ScopeCertificate_SuppyChainOperator",
+        "s21": "vw_ScopeCertificateStandard",
+    },
+    select=[
+        "s2.Product_Category_Desc",
+        "s2.Product_Category_Code",
+        "s2.Product_Detail_Desc",
+        "s2.Product_Detail_Code",
+        "s2.Raw Matetrial Description",
+        "s2.Raw_Material_Percentage",
+        "s1.Facility Name",
+        "s2.Raw_Material_Code",
+    ],
+    where=[
+        ("in", "s1.facility_type", "'Subsequent'", "'Main Facility'"),
+        ("in", "s11.SCO_Name", Slot("row.Certified Organization Name", lit_quoted)),
+        ("in", "s11.SCO_Country", Slot("row.Country/Area")),
+        ("in", "s11.SCO_License", Slot("row.License Number")),
+        ("in", "s11.SCO_Native_Name", Slot("row.Native Name")),
+        ("in", "s11.SC_Number", Slot("row.SC Number")),
+        ("in", "s11.SC_Status", Slot("row.SC Status")),
+        ("in", "s11.Retired_CO_Te_Id", Slot("row.Retired TE ID")),
+        ("in", "s21.Grouped SC Standard", Slot("row.Standard")),
+        ("contains", "s11.SC Number | SC Version No", Slot("row.SC Number")),
+        ("in", "s11.CB_Name", Slot("row.Certification Body")),
+        ("in", "s11.CO_Te_Id", Slot("row.TE ID")),
+        ("in", "s11.SC_Version_No", Slot("row.SC Version Number")),
+        ("in", "s11.SC_Last_Updated_Date", Slot("row.LastUpdated_Timestamp", lit_date)),
+        *excluded_sc_conditions("s11"),
+    ],
+    groupings=[[6], [1], [0], [3], [2], [7], [4], [5]],
+    locale="en",
+    metrics=True,
+    subtotal=True,
+)
 
-                if len(C) == 1:
-                    desc = vdict("D8", C[0])
-                    cb   = vdict("D9", 0) 
-                    ctx["process_category_description"] = desc
-                    ctx["cb_code"] = cb
-                    rows.append(ctx.copy())
 
+def build_products_payload(row):
+    return PRODUCTS_QUERY.build(row=row)
 
-                elif len(C) == 2:
-                    desc = vdict("D8", C[0])
-                    cb   = vdict("D9", C[1])
-                    ctx["process_category_description"] = desc
-                    ctx["cb_code"] = cb
-                    rows.append(ctx.copy())
 
+# ==========================================
+# DECODE PRODUCTS 
+# ==========================================
 
-        if "M" not in node:
-            return
+PRODUCTS_FIELDS = {
+    "G0": "Facility Name",
+    "G1": "Product Category Code",
+    "G2": "Product Category Description",
+    "G3": "Product Detail Code",
+    "G4": "Product Detail Description",
+    "G5": "Raw Material Code",
+    "G6": "Raw Material Description",
+    "G7": "Raw Material Percentage",
+}
+PRODUCTS_DICTS = {f"G{i}": f"D{i - 1}" for i in range(1, 8)}
 
-        for block in node["M"]:
-            for dmname, children in block.items():
-                for child in children:
-                    walk(child, ctx)
 
+def extract_products(js):
+    return DSRColumns(PRODUCTS_FIELDS, dicts=PRODUCTS_DICTS).extend(js).records()
 
-    for root in PH["DM0"]:
-        walk(root, {})
 
-    return rows
+def fetch_products(row, frame=True):
+    log("\n📡 Fetching PRODUCT DATA...")
 
+    columns = DSRColumns(PRODUCTS_FIELDS, dicts=PRODUCTS_DICTS)
+    query_columns(columns, build_products_payload(row), "PRODUCT", sc_version(row))
 
-# EXTRACTION DES FACILITIES
-rows = extract_facilities(js_fac)
+    log("✅ Product DATA EXTRACTED SUCCESSFULLY")
+    return section_view(columns, frame)
 
-# DATAFRAME
-df_fac = pd.DataFrame(rows)
 
-df_fac = df_fac.rename(
-    columns={
-        "facility_type": "Facility Type",
-        "facility_name": "Facility Name",
-        "te_id": "TE ID",
-        "retired_te_id": "Retired TE ID",
-        "address": "Address",
-        "state": "State/Province",
-        "country": "Country/Area",
-        "standard": "Standard",
-        "process_category_code": "Process Category Code",
-        "process_category_description": "Process Category Description",
-        "cb_code": "CB Code",
-    }
+# -----------------------------
+# Facility
+# -----------------------------
+FACILITY_QUERY = QueryTemplate(
+    visual="9dcd0600752094910de4",
+    sources={
+        "s1": "vw_facility",
+        "s2": "vw_FacilityStandard",
+        "s3": "vw_Process",
+        "s": "vw_ScopeCertificate_SuppyChainOperator",
+        "s21": "vw_ScopeCertificateStandard",
+    },
+    select=[
+        "s1.facility_type",
+        "s2.Facility_Standard_Name",
+        "s3.Process_Category_Code",
+        "s3.Process_Category_Description",
+        "min:s.CB_Code",
+        ("s1.TE ID", "TE ID"),
+        ("s1.Retired TE ID", "Retired TE ID"),
+        ("s1.Facility Name", "Name"),
+        ("s1.Facility Address", "Address"),
+        ("s1.Facility Country", "Country/Area"),
+        ("s1.Facility State", "State/Province"),
+    ],
+    where=[
+        ("in", "s1.facility_type", "'Main Facility'", "'Subsequent'"),
+        ("in", "s.SCO_Name", Slot("row.Certified Organization Name", lit_quoted)),
+        ("in", "s.SCO_Country", Slot("row.Country/Area")),
+        ("in", "s.SCO_License", Slot("row.License Number")),
+        ("in", "s.SCO_Native_Name", Slot("row.Native Name")),
+        ("in", "s.SC_Number", Slot("row.SC Number")),
+        ("contains", "s.SC Number | SC Version No", Slot("row.SC Number")),
+        ("in", "s.SC_Status", Slot("row.SC Status")),
+        ("in", "s.CB_Name", Slot("row.Certification Body")),
+        ("in", "s.CO_Te_Id", Slot("row.TE ID")),
+        ("in", "s.Retired_CO_Te_Id", Slot("row.Retired TE ID")),
+        ("in", "s.SC_Version_No", Slot("row.SC Version Number")),
+        ("in", "s21.Grouped SC Standard", Slot("row.Standard")),
+        ("in", "s.SC_Last_Updated_Date", Slot("row.LastUpdated_Timestamp", lit_date)),
+        *excluded_sc_conditions("s"),
+    ],
+    groupings=[[0], [7], [5], [6], [8], [10], [9], [1], [2], [3, 4]],
+    named=True,
+    locale="en",
+    metrics=True,
 )
 
-expected_cols = [
-    "Facility Type",
-    "Facility Name",
-    "TE ID",
-    "Retired TE ID",
-    "Address",
-    "State/Province",
-    "Country/Area",
-    "Standard",
-    "Process Category Code",
-    "Process Category Description",
-    "CB Code",
-]
 
-for col in expected_cols:
-    if col not in df_fac.columns:
-        df_fac[col] = None
+def build_facility_payload(row):
+    return FACILITY_QUERY.build(row=row)
 
-df_fac = df_fac[expected_cols]
-print("✅ Facility DATA EXTRACTED SUCCESSFULLY")
 
+# ==========================================================
+# DECODE Facility Data
+# ==========================================================
+FACILITY_FIELDS = {
+    "G0": "Facility Type",
+    "G1": "Facility Name",
+    "G2": "TE ID",
+    "G3": "Retired TE ID",
+    "G4": "Address",
+    "G5": "State/Province",
+    "G6": "Country/Area",
+    "G7": "Standard",
+    "G8": "Process Category Code",
+    "G9": "Process Category Description",
+    "A0": "CB Code",
+}
+FACILITY_DICTS = {**{f"G{i}": f"D{i - 1}" for i in range(1, 10)}, "A0": "D9"}
 
-row_facilities = df_fac.iloc[0]
+def extract_facilities(js):
+    return DSRColumns(FACILITY_FIELDS, dicts=FACILITY_DICTS).extend(js).records()
 
-def lit(v):
-    if v is None or pd.isna(v) or v == "null":
-        return "null"
 
-    if isinstance(v, str) and v.strip() == "":
-        return "''"
+def fetch_facilities(row, frame=True):
+    log("\n📡 Fetching FACILITY DATA...")
 
-    return f"'{v}'"
+    columns = DSRColumns(FACILITY_FIELDS, dicts=FACILITY_DICTS)
+    query_columns(columns, build_facility_payload(row), "FACILITY", sc_version(row))
+
+    log("✅ Facility DATA EXTRACTED SUCCESSFULLY")
+    return section_view(columns, frame)
 
 
 # -----------------------------
 # CONTACT
 # -----------------------------
-payload_contact = {
-    "version": "1.0.0",
-    "allowLongRunningQueries": True,
-    "modelId": 4668616,
-    "queries": [
-        {
-            "QueryId": "",
-            "ApplicationContext": {
-                "DatasetId": "30385b55-d526-401d-8379-6a502d67c719",
-                "Sources": [
-                    {
-                        "ReportId": "5bbb73cf-c2c7-4c8d-8461-f04b75a9438b",
-                        "VisualId": "269b05deaa4bee5d72dd",
-                    }
-                ],
-            },
-            "Query": {
-                "Commands": [
-                    {
-                        "SemanticQueryDataShapeCommand": {
-                            "Query": {
-                                "Version": 2,
-                                "From": [
-                                    {
-                                        "Name": "s1",
-                                        "Entity": "semantic vw_supply_chain_operator_email",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s2",
-                                        "Entity": "semantic vw_ScopeCertificate_SuppyChainOperator",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s11",
-                                        "Entity": "semantic vw_facility",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s21",
-                                        "Entity": "semantic vw_ScopeCertificateStandard",
-                                        "Type": 0,
-                                    },
-                                ],
-                                "Select": [
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s1"}
-                                            },
-                                            "Property": "SCO_Public_Email",
-                                        },
-                                        "Name": "semantic vw_supply_chain_operator_email.SCO_Public_Email",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SCO_Contact",
-                                        },
-                                        "Name": "semantic vw_ScopeCertificate_SuppyChainOperator.SCO_Contact",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SCO_Address",
-                                        },
-                                        "Name": "semantic vw_ScopeCertificate_SuppyChainOperator.SCO_Address",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SCO_State",
-                                        },
-                                        "Name": "semantic vw_ScopeCertificate_SuppyChainOperator.SCO_State",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SCO_Country",
-                                        },
-                                        "Name": "semantic vw_ScopeCertificate_SuppyChainOperator.SCO_Country",
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SCO_Website",
-                                        },
-                                        "Name": "semantic vw_ScopeCertificate_SuppyChainOperator.SCO_Website",
-                                    },
-                                ],
-                                "Where": [
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certified Organization Name"].replace("'", "''")
-                                                                
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Country",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Country/Area"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_License",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "License Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Native_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Native Name"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Number",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Number"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Status",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Status"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "Retired_CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Retired TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "Contains": {
-                                                "Left": {
-                                                    "Column": {
-                                                        "Expression": {
-                                                            "SourceRef": {
-                                                                "Source": "s11"
-                                                            }
-                                                        },
-                                                        "Property": "Facility_Name",
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Literal": {
-                                                        "Value": lit(
-                                                            row_facilities[
-                                                                "Facility Name"].replace("'", "''")
-                                                            
-                                                        )
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "CB_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certification Body"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Version_No",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "SC Version Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s21"
-                                                                }
-                                                            },
-                                                            "Property": "Grouped SC Standard",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Standard"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Last_Updated_Date",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "LastUpdated_Timestamp"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                ],
-                            },
-                            "Binding": {
-                                "Primary": {
-                                    "Groupings": [
-                                        {
-                                            "Projections": [1, 2, 3, 4, 0, 5],
-                                            "ShowItemsWithNoData": [1, 2, 3, 4, 0, 5],
-                                        }
-                                    ]
-                                },
-                                "DataReduction": {
-                                    "DataVolume": 3,
-                                    "Primary": {"Window": {"Count": 500}},
-                                },
-                                "Version": 1,
-                            },
-                        }
-                    }
-                ]
-            },
-        }
+CONTACT_QUERY = QueryTemplate(
+    visual="269b05deaa4bee5d72dd",
+    sources={
+        "s1": "vw_supply_chain_operator_email",
+        "s2": "vw_ScopeCertificate_SuppyChainOperator",
+        "s11": "vw_facility",
+        "s21": "vw_ScopeCertificateStandard",
+    },
+    select=[
+        "s1.SCO_Public_Email",
+        "s2.SCO_Contact",
+        "s2.SCO_Address",
+        "s2.SCO_State",
+        "s2.SCO_Country",
+        "s2.SCO_Website",
     ],
-}
-
-
-# REQUEST
-print("\n📡 Fetching CONTACT DATA...")
-
-res_contact = post_with_auto_token(URL, headers=BASE_HEADERS, json=payload_contact)
+    where=[
+        ("in", "s2.SCO_Name", Slot("row.Certified Organization Name", lit_quoted)),
+        ("in", "s2.SCO_Country", Slot("row.Country/Area")),
+        ("in", "s2.SCO_License", Slot("row.License Number")),
+        ("in", "s2.SCO_Native_Name", Slot("row.Native Name")),
+        ("in", "s2.SC_Number", Slot("row.SC Number")),
+        ("in", "s2.SC_Status", Slot("row.SC Status")),
+        ("in", "s2.Retired_CO_Te_Id", Slot("row.Retired TE ID")),
+        ("contains", "s11.Facility_Name", Slot("facility.Facility Name", lit_quoted)),
+        ("in", "s2.CB_Name", Slot("row.Certification Body")),
+        ("in", "s2.CO_Te_Id", Slot("row.TE ID")),
+        ("in", "s2.SC_Version_No", Slot("row.SC Version Number")),
+        ("in", "s21.Grouped SC Standard", Slot("row.Standard")),
+        ("in", "s2.SC_Last_Updated_Date", Slot("row.LastUpdated_Timestamp")),
+    ],
+    groupings=[[1, 2, 3, 4, 0, 5]],
+    named=True,
+    show_items=True,
+)
 
-if res_contact.status_code != 200:
-    print("❌ ERROR CONTACT:", res_contact.text)
-    exit()
 
-js_contact = res_contact.json()
+def build_contact_payload(row, row_facilities):
+    return CONTACT_QUERY.build(row=row, facility=row_facilities)
 
 
 # ==========================================
 # DECODE
 # ==========================================
-def decode_contact(js):
-    try:
-        ds = js["results"][0]["result"]["data"]["dsr"]["DS"][0]
-    except:
-        return []
+CONTACT_FIELDS = {
+    "G0": "Contact",
+    "G1": "Adress",
+    "G2": "State/Province",
+    "G3": "Country/Area",
+    "G4": "Public Email",
+    "G5": "Website",
+}
+CONTACT_DICTS = {f"G{i}": f"D{i}" for i in range(6)}
 
-    vd = ds.get("ValueDicts", {})
-    rows_raw = ds["PH"][0]["DM0"]
+def decode_contact(js):
+    return DSRColumns(CONTACT_FIELDS, dicts=CONTACT_DICTS).extend(js).records()
 
-    rows = []
 
-    for r in rows_raw:
-        C = r["C"] 
+def fetch_contact(row, row_facilities, frame=True):
+    log("\n📡 Fetching CONTACT DATA...")
 
-        contact = vd["D0"][C[0]] if len(vd["D0"]) > 0 else None
-        addr = vd["D1"][C[1]] if len(vd["D1"]) > 0 else None
-        state = vd["D2"][C[2]] if len(vd["D2"]) > 0 else None
-        country = vd["D3"][C[3]] if len(vd["D3"]) > 0 else None
-        email = vd["D4"][C[4]] if len(vd["D4"]) > 0 else None
-        website = vd["D5"][0] if len(vd["D5"]) > 0 else None
+    columns = DSRColumns(CONTACT_FIELDS, dicts=CONTACT_DICTS)
+    if row_facilities is None:
+        # the contact query filters on the first facility row
+        log("⚠️ NO FACILITY ROWS: CONTACT QUERY SKIPPED")
+        return section_view(columns, frame)
 
-        rows.append([contact, addr, state, country, email, website])
+    query_columns(columns, build_contact_payload(row, row_facilities), "CONTACT", sc_version(row))
 
-    return rows
+    log("✅ CONTACT DATA EXTRACTED SUCCESSFULLY")
+    return section_view(columns, frame)
 
 
+# -----------------------------
+#  SC_Certificate
+# -----------------------------
 
-# DATAFRAME
-df_contact = pd.DataFrame(
-    decode_contact(js_contact),
-    columns=[
-        "Contact",
-        "Adress",
-        "State/Province",
-        "Country/Area",
-        "Public Email",
-        "Website",
+CERTIFICATE_QUERY = QueryTemplate(
+    visual="64d20318459ec7516171",
+    sources={"s2": "vw_ScopeCertificate_SuppyChainOperator", "s3": "vw_ScopeCertificateStandard"},
+    select=[
+        "s2.SC_Number",
+        "s2.SCO_Name",
+        "s3.SC_Program",
+        "s2.SC_IssuedDate",
+        "s2.SC_ValidToDate",
+        "s2.SC_Version_No",
+        "s2.SC Grouped Standards",
+        "s2.CO_Te_Id",
+        ("s2.Retired_CO_Te_Id", "Retired TE ID"),
     ],
+    where=[
+        ("eq", "s2.Record_Add_Flag", "0L"),
+        ("in", "s2.SCO_Name", Slot("row.Certified Organization Name", lit_quoted)),
+        ("in", "s2.SCO_Country", Slot("row.Country/Area")),
+        ("in", "s2.SCO_License", Slot("row.License Number")),
+        ("in", "s2.SCO_Native_Name", Slot("row.Native Name")),
+        ("in", "s2.SC_Number", Slot("row.SC Number")),
+        ("in", "s2.SC_Status", Slot("row.SC Status")),
+        ("in", "s2.CB_Name", Slot("row.Certification Body")),
+        ("in", "s2.CO_Te_Id", Slot("row.TE ID")),
+        ("in", "s2.Retired_CO_Te_Id", Slot("row.Retired TE ID")),
+        ("in", "s2.SC_Version_No", Slot("row.SC Version Number")),
+        ("in", "s3.Grouped SC Standard", Slot("row.Standard")),
+        ("contains", "s2.SC Number | SC Version No", Slot("row.SC Number")),
+    ],
+    groupings=[[0, 5, 7, 8, 1, 3, 4, 2, 6]],
+    metrics=True,
+    show_items=True,
 )
-print("✅ CONTACT DATA EXTRACTED SUCCESSFULLY")
 
 
-# -----------------------------
-#  SC_Certificate
-# -----------------------------
+def build_certificate_payload(row):
+    return CERTIFICATE_QUERY.build(row=row)
 
-payload_certificate = {
-    "version": "1.0.0",
-    "allowLongRunningQueries": True,
-    "modelId": 4668616,
-    "queries": [
-        {
-            "QueryId": "",
-            "ApplicationContext": {
-                "DatasetId": "30385b55-d526-401d-8379-6a502d67c719",
-                "Sources": [
-                    {
-                        "ReportId": "5bbb73cf-c2c7-4c8d-8461-f04b75a9438b",
-                        "VisualId": "64d20318459ec7516171",
-                    }
-                ],
-            },
-            "Query": {
-                "Commands": [
-                    {
-                        "SemanticQueryDataShapeCommand": {
-                            "ExecutionMetricsKind": 1,
-                            "Query": {
-                                "Version": 2,
-                                "From": [
-                                    {
-                                        "Name": "s2",
-                                        "Entity": "semantic vw_ScopeCertificate_SuppyChainOperator",
-                                        "Type": 0,
-                                    },
-                                    {
-                                        "Name": "s3",
-                                        "Entity": "semantic vw_ScopeCertificateStandard",
-                                        "Type": 0,
-                                    },
-                                ],
-                                "Select": [
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SC_Number",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SCO_Name",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s3"}
-                                            },
-                                            "Property": "SC_Program",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SC_IssuedDate",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SC_ValidToDate",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SC_Version_No",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "SC Grouped Standards",
-                                        }
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "CO_Te_Id",
-                                        },
-                                      
-                                    },
-                                    {
-                                        "Column": {
-                                            "Expression": {
-                                                "SourceRef": {"Source": "s2"}
-                                            },
-                                            "Property": "Retired_CO_Te_Id",
-                                        },
-                                        "NativeReferenceName": "Retired TE ID",
-                                    },
-                                ],
-                                "Where": [
-                                    {
-                                        "Condition": {
-                                            "Comparison": {
-                                                "ComparisonKind": 0,
-                                                "Left": {
-                                                    "Column": {
-                                                        "Expression": {
-                                                            "SourceRef": {
-                                                                "Source": "s2"
-                                                            }
-                                                        },
-                                                        "Property": "Record_Add_Flag",
-                                                    }
-                                                },
-                                                "Right": {"Literal": {"Value": "0L"}},
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certified Organization Name"].replace("'", "''")
-                                                                    
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Country",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Country/Area"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_License",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "License Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SCO_Native_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Native Name"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Number",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Number"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Status",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["SC Status"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "CB_Name",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "Certification Body"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "Retired_CO_Te_Id",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Retired TE ID"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s2"
-                                                                }
-                                                            },
-                                                            "Property": "SC_Version_No",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row[
-                                                                        "SC Version Number"
-                                                                    ]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "In": {
-                                                "Expressions": [
-                                                    {
-                                                        "Column": {
-                                                            "Expression": {
-                                                                "SourceRef": {
-                                                                    "Source": "s3"
-                                                                }
-                                                            },
-                                                            "Property": "Grouped SC Standard",
-                                                        }
-                                                    }
-                                                ],
-                                                "Values": [
-                                                    [
-                                                        {
-                                                            "Literal": {
-                                                                "Value": lit(
-                                                                    row["Standard"]
-                                                                )
-                                                            }
-                                                        }
-                                                    ]
-                                                ],
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "Condition": {
-                                            "Contains": {
-                                                "Left": {
-                                                    "Column": {
-                                                        "Expression": {
-                                                            "SourceRef": {
-                                                                "Source": "s2"
-                                                            }
-                                                        },
-                                                        "Property": "SC Number | SC Version No",
-                                                    }
-                                                },
-                                                "Right": {
-                                                    "Literal": {
-                                                        "Value": lit(row["SC Number"])
-                                                    }
-                                                },
-                                            }
-                                        }
-                                    },
-                                ],
-                            },
-                            "Binding": {
-                                "Primary": {
-                                    "Groupings": [
-                                        {
-                                            "Projections": [0, 5, 7, 8, 1, 3, 4, 2, 6],
-                                            "ShowItemsWithNoData": [
-                                                0,
-                                                5,
-                                                7,
-                                                8,
-                                                1,
-                                                3,
-                                                4,
-                                                2,
-                                                6,
-                                            ],
-                                        }
-                                    ]
-                                },
-                                "DataReduction": {
-                                    "DataVolume": 3,
-                                    "Primary": {"Window": {"Count": 500}},
-                                },
-                                "Version": 1,
-                            },
-                        }
-                    }
-                ]
-            },
-        }
-    ],
+
+# ==========================================================
+# DCODEUR
+# ==========================================================
+CERTIFICATE_FIELDS = {
+    "G0": "SC_Number",
+    "G1": "SC_Version_No",
+    "G2": "CO_Te_Id",
+    "G3": "Retired_CO_Te_Id",
+    "G4": "SCO_Name",
+    "G5": "SC_IssuedDate",
+    "G6": "SC_ValidToDate",
+    "G7": "SC_Program",
+    "G8": "SC_Grouped_Standards",
 }
 
 
-print("\n📡 Fetching SCOPE CERTIFICATE DATA...")
+CERTIFICATE_DATES = ("SC_IssuedDate", "SC_ValidToDate")
+CERTIFICATE_DICTS = {"G0": "D0", "G1": "D1", "G2": "D2", "G3": "D3", "G4": "D4", "G7": "D5", "G8": "D6"}
 
-res_certificate = post_with_auto_token(URL, headers=BASE_HEADERS, json=payload_certificate)
 
-if res_certificate.status_code != 200:
-    print("❌ ERROR CERTIFICATE:", res_certificate.text)
-    exit()
+def certificate_columns(js):
+    # exactly one row: the first one the visual returns, or None everywhere
+    # its C carries the two dates after padding zeros, hence c_tail
+    columns = DSRColumns(CERTIFICATE_FIELDS, CERTIFICATE_DATES, CERTIFICATE_DICTS, c_tail=True).extend(js)
+    if len(columns):
+        columns.truncate(1)
+    else:
+        columns.append_empty()
+    return columns
 
-js_certificate = res_certificate.json()
 
+def extract_sc(js):
+    return certificate_columns(js).first()
 
 
-# ==========================================================
-# DCODEUR
-# ==========================================================
-from datetime import datetime, timezone
+def fetch_scope_certificate(row, frame=True):
+    log("\n📡 Fetching SCOPE CERTIFICATE DATA...")
 
-def extract_sc(js):
-    data = js["results"][0]["result"]["data"]["dsr"]["DS"][0]
+    js_certificate = run_query(build_certificate_payload(row), "CERTIFICATE", sc_version(row))
+
+    with stage("decode"):
+        columns = certificate_columns(js_certificate)
 
-    vd = data["ValueDicts"]
-    dm0 = data["PH"][0]["DM0"][0]
-    C = dm0["C"]
+    log("✅ SCOPE CERTIFICATE DATA EXTRACTED SUCCESSFULLY")
+    return section_view(columns, frame)
 
-    DATE_INDEX = {
-        "G5": 4,  
-        "G6": 5,  
+
+# ============================================================
+# QUERY SCHEDULER
+# ============================================================
+# Each query only depends on the rows it filters on: product, facility and
+# certificate need the SC header row, contact also needs the first facility.
+# Queries are submitted as soon as their inputs are ready. Nodes return
+# DSRColumns; records or DataFrames are only built for callers that ask.
+SECTIONS = ("sc", "products", "facilities", "contact", "certificate")
+
+
+def verification_graph(sc_number, sections=None):
+    def header(r):
+        # dates as datetimes: sc_version() keys on the exact last-updated time
+        return r["sc"].first(datetimes=True)
+
+    def first_facility(r):
+        return r["facilities"].first() if len(r["facilities"]) else None
+
+    graph = {
+        "sc": ((), lambda r: fetch_sc_header(sc_number, frame=None)),
+        "products": (("sc",), lambda r: fetch_products(header(r), frame=None)),
+        "facilities": (("sc",), lambda r: fetch_facilities(header(r), frame=None)),
+        "contact": (
+            ("sc", "facilities"),
+            lambda r: fetch_contact(header(r), first_facility(r), frame=None),
+        ),
+        "certificate": (("sc",), lambda r: fetch_scope_certificate(header(r), frame=None)),
     }
+    if sections is None:
+        return graph
 
-    def val(key):
-        for entry in dm0["S"]:
-            if entry["N"] == key:
+    unknown = set(sections) - set(graph)
+    if unknown:
+        raise ValueError(f"❌ UNKNOWN SECTIONS: {sorted(unknown)} (expected {', '.join(SECTIONS)})")
 
+    # requested sections plus everything they depend on
+    needed = set()
+    todo = list(sections)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(graph[name][0])
+    return {name: node for name, node in graph.items() if name in needed}
 
-                if "DN" in entry:
-                    dn = entry["DN"]
-                    idx = dm0.get(key)
 
-                    if dn not in vd or not vd[dn]:
-                        return None
+# Worker threads per SC verification (the widest fan-out is three queries)
+QUERY_WORKERS = 4
 
-                    if isinstance(idx, int) and idx < len(vd[dn]):
-                        return vd[dn][idx]
 
-                    return vd[dn][0]
+def _run_node(timer, name, fn, results):
+    # stages of a node are charged to the caller's timer under its section
+    with stage_timer(timer, name):
+        return fn(results)
 
-                if entry.get("T") == 7 and key in DATE_INDEX:
-                    ts = C[DATE_INDEX[key]]
-                    return (
-                        datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
-                        .strftime("%Y-%m-%d")
-                        if ts else None
-                    )
 
-        return None
-    
-    return {
-        "SC_Number": val("G0"),
-        "SC_Version_No": val("G1"),
-        "CO_Te_Id": val("G2"),
-        "Retired_CO_Te_Id": val("G3"),
-        "SCO_Name": val("G4"),
-        "SC_IssuedDate": val("G5"),
-        "SC_ValidToDate": val("G6"),
-        "SC_Program": val("G7"),
-        "SC_Grouped_Standards": val("G8"),
-    }
+def run_query_graph(graph, max_workers=QUERY_WORKERS):
+    results = {}
+    pending = dict(graph)
+    running = {}
+    timer, _ = current_stage_timer()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, (deps, fn) in list(pending.items()):
+                if all(d in results for d in deps):
+                    running[pool.submit(_run_node, timer, name, fn, dict(results))] = name
+                    del pending[name]
+
+            if not running:
+                raise Exception(f"❌ UNRESOLVED QUERY DEPENDENCIES: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    results[name] = fut.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+
+    return results
+
+
+# ============================================================
+# LIBRARY API
+# ============================================================
+# verify_sc() is the entry point for embedding; the CLI below is a thin
+# wrapper around it. Nothing runs at import time, pandas is imported when the
+# first DataFrame is built and Playwright only for tokens and screenshots.
+def verify_sc(sc_number, sections=None, frames=True):
+    """Verify one SC number and return {section: DataFrame} for SECTIONS.
 
+    `sections` limits the queries to those sections and the ones they depend
+    on, e.g. verify_sc(sc, "sc") only checks the header. Dictionary-encoded
+    columns come back as Categoricals. With frames=False each section is a
+    list of dicts and pandas is never imported; frames="arrow" gives pyarrow
+    Tables with DictionaryArrays and frames=None the DSRColumns themselves.
+    Raises SCNotFoundError when the SC number does not exist."""
+    if sections is None:
+        sections = SECTIONS
+    elif isinstance(sections, str):
+        sections = (sections,)
 
-result = extract_sc(js_certificate)
-df_scope_certificate = pd.DataFrame([result])
+    results = run_query_graph(verification_graph(sc_number, sections))
 
-print("✅ SCOPE CERTIFICATE DATA EXTRACTED SUCCESSFULLY")
+    return {name: section_view(results[name], frames) for name in sections}
+
+
+# DateTime columns are datetime64 in the frames and only formatted here
+HTML_DATE_FORMAT = "%Y-%m-%d"
 
 
 def df_to_html_rows(df):
     if df is None or df.empty:
         return ""
 
+    dates = df.select_dtypes("datetime").columns
+    if len(dates):
+        df = df.assign(**{name: df[name].dt.strftime(HTML_DATE_FORMAT) for name in dates})
+
     rows_html = []
 
     for _, row in df.iterrows():
         tds = []
         for value in row:
-            if value is None or pd.isna(value):
+            if _isna(value):
                 tds.append("<td></td>")
             else:
                 tds.append(f"<td>{value}</td>")
@@ -3410,36 +2537,312 @@ def df_to_html_rows(df):
 
     return "\n".join(rows_html)
 
-Site_Listing_ROWS= df_to_html_rows(df_sc)
-CONTACT_ROWS = df_to_html_rows(df_contact)
-SC_ROWS = df_to_html_rows(df_scope_certificate)      # Scope Certificate Data
-FACILITY_ROWS = df_to_html_rows(df_fac)
-SCOPE_PRODUCT_ROWS = df_to_html_rows(df_products)
 
-HTML_TEMPLATE_PATH = "/Users/mac/generateToken/TE_HTML.html"
+# ============================================================
+# HTML REPORT
+# ============================================================
+# the report template ships next to this script
+HTML_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TE_HTML.html")
+
+
+def render_html(sc_number, results):
+    with stage("html_rows", "sc"):
+        Site_Listing_ROWS= df_to_html_rows(results["sc"])
+    with stage("html_rows", "contact"):
+        CONTACT_ROWS = df_to_html_rows(results["contact"])
+    with stage("html_rows", "certificate"):
+        SC_ROWS = df_to_html_rows(results["certificate"])      # Scope Certificate Data
+    with stage("html_rows", "facilities"):
+        FACILITY_ROWS = df_to_html_rows(results["facilities"])
+    with stage("html_rows", "products"):
+        SCOPE_PRODUCT_ROWS = df_to_html_rows(results["products"])
+
+    with stage("template"):
+        with open(HTML_TEMPLATE_PATH, "r", encoding="utf-8") as f:
+            html = f.read()
+        html = html.replace("{{Site_Listing_ROWS}}", Site_Listing_ROWS)
+        html = html.replace("{{CONTACT_ROWS}}", CONTACT_ROWS)
+        html = html.replace("{{SC_ROWS}}", SC_ROWS)
+        html = html.replace("{{FACILITY_ROWS}}", FACILITY_ROWS)
+        html = html.replace("{{SCOPE_PRODUCT_ROWS}}", SCOPE_PRODUCT_ROWS)
+        today = datetime.today().strftime("%d %B %Y")
+        html = html.replace("{{LAST_REFRESHED}}", today)
+
+    OUTPUT_HTML = f"TE_Scope_Certificate_{sc_number}.html"
+
+    with stage("write"):
+        with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
+            f.write(html)
+
+    return OUTPUT_HTML
 
-with open(HTML_TEMPLATE_PATH, "r", encoding="utf-8") as f:
-    html = f.read()
-html = html.replace("{{Site_Listing_ROWS}}", Site_Listing_ROWS)
-html = html.replace("{{CONTACT_ROWS}}", CONTACT_ROWS)
-html = html.replace("{{SC_ROWS}}", SC_ROWS)
-html = html.replace("{{FACILITY_ROWS}}", FACILITY_ROWS)
-html = html.replace("{{SCOPE_PRODUCT_ROWS}}", SCOPE_PRODUCT_ROWS)
-today = datetime.today().strftime("%d %B %Y")
-html = html.replace("{{LAST_REFRESHED}}", today)
 
-OUTPUT_HTML = f"TE_Scope_Certificate_{sc_number}.html"
+# ============================================================
+# BATCH VERIFICATION
+# ============================================================
+SC_COLUMN_NAMES = ("sc_number", "sc number", "sc")
 
-with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
-    f.write(html)
 
-print(f"✅ HTML GENERATED → {OUTPUT_HTML}")
+def read_sc_numbers(path):
+    """Read SC numbers from a CSV, NDJSON or one-per-line file ('-' = stdin)."""
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            text = f.read()
 
-OUTPUT_PNG = f"TE_Scope_Certificate_{sc_number}.png"
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    if not lines:
+        return []
+
+    # NDJSON: one object per line
+    if lines[0].startswith("{"):
+        sc_numbers = []
+        for l in lines:
+            obj = {k.lower(): v for k, v in json.loads(l).items()}
+            value = next((obj[k] for k in SC_COLUMN_NAMES if obj.get(k)), None)
+            if value:
+                sc_numbers.append(str(value).strip())
+        return sc_numbers
+
+    # CSV (or plain list): SC column by header name, else first column
+    rows = list(csv.reader(lines))
+    header = [c.strip().lower() for c in rows[0]]
+    col = 0
+    for name in SC_COLUMN_NAMES:
+        if name in header:
+            col = header.index(name)
+            rows = rows[1:]
+            break
+
+    return [r[col].strip() for r in rows if len(r) > col and r[col].strip()]
+
+
+def _render_record(sc_number, results):
+    frames = {}
+    for name, columns in results.items():
+        with stage("frame", name):
+            frames[name] = columns.frame()
+    output_html = render_html(sc_number, frames)
+    output_png = f"TE_Scope_Certificate_{sc_number}.png"
+    with stage("screenshot"):
+        screenshot_html(output_html, output_png)
+    return output_html, output_png
+
+
+def verify_record(sc_number, render=False):
+    """Verify one SC. If the SC verifies but its report or screenshot fails,
+    the status is "render_error" rather than "error" and the records are kept."""
+    t0 = time.perf_counter()
+    timer = StageTimer() if STAGE_TIMING else None
+    try:
+        with stage_timer(timer):
+            results = verify_sc(sc_number, frames=None)
+    except SCNotFoundError as e:
+        record = {
+            "sc_number": sc_number,
+            "status": "not_found",
+            "error": str(e),
+            "elapsed": round(time.perf_counter() - t0, 3),
+        }
+    except Exception as e:
+        record = {
+            "sc_number": sc_number,
+            "status": "error",
+            "error": str(e) or type(e).__name__,
+            "elapsed": round(time.perf_counter() - t0, 3),
+        }
+    else:
+        record = {"sc_number": sc_number, "status": "ok"}
+        if render:
+            try:
+                with stage_timer(timer):
+                    record["html"], record["png"] = _render_record(sc_number, results)
+            except Exception as e:
+                record["status"] = "render_error"
+                record["error"] = str(e) or type(e).__name__
+        record["elapsed"] = round(time.perf_counter() - t0, 3)
+        with stage_timer(timer):
+            for name, columns in results.items():
+                with stage("records", name):
+                    record[name] = columns.records()
+
+    if timer is not None:
+        record["stages"] = timer.rounded()
+    return record
+
+
+def run_batch(sc_numbers, output, concurrency=8, pool_size=None, render=False):
+    """Verify every SC with at most `concurrency` in flight, one NDJSON record per SC."""
+    global VERBOSE
+    VERBOSE = False
+
+    # every in-flight SC can have QUERY_WORKERS queries open at once
+    configure_http_pool(pool_size or concurrency * QUERY_WORKERS)
+
+    # replayed responses need no token
+    refresher = None if REPLAY_DIR else TokenRefresher()
+    if refresher is not None:
+        refresher.start()
+
+    t0 = time.perf_counter()
+    summary = {
+        "total": len(sc_numbers), "ok": 0, "not_found": 0, "error": 0, "render_error": 0,
+        "failed": [], "render_failed": [],
+    }
+
+    try:
+        with open(output, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(verify_record, sc, render) for sc in sc_numbers]
+
+            for done, fut in enumerate(as_completed(futures), 1):
+                record = fut.result()
+                out.write(json_codec().dumps(record, default=str).decode("utf-8") + "\n")
+                out.flush()
+
+                summary[record["status"]] += 1
+                if record["status"] == "ok":
+                    print(f"✅ [{done}/{len(futures)}] {record['sc_number']} ({record['elapsed']:.2f}s)")
+                elif record["status"] == "not_found":
+                    print(f"🚫 [{done}/{len(futures)}] {record['sc_number']}: not found")
+                elif record["status"] == "render_error":
+                    summary["render_failed"].append(record["sc_number"])
+                    print(f"⚠️ [{done}/{len(futures)}] {record['sc_number']}: verified, report failed: {record['error']}")
+                else:
+                    summary["failed"].append(record["sc_number"])
+                    print(f"❌ [{done}/{len(futures)}] {record['sc_number']}: {record['error']}")
+    finally:
+        if refresher is not None:
+            refresher.stop()
+
+    elapsed = time.perf_counter() - t0
+    summary["elapsed"] = round(elapsed, 3)
+    summary["token_refreshes"] = refresher.refreshes if refresher is not None else 0
+    summary["per_second"] = round(len(sc_numbers) / elapsed, 3) if elapsed else None
+    summary["concurrency"] = concurrency
+    summary.update(run_stats())
+    return summary
+
+
+def run_stats():
+    return {
+        "json_codec": json_codec().name,
+        "http": http_pool_stats(),
+        "multi_query": query_batching_stats(),
+        "cache": response_cache_stats(),
+        "not_found_cache": not_found_cache_stats(),
+    }
+
+
+def print_run_stats(stats):
+    http = stats["http"]
+    print(f"🔌 {http['requests']} REQUESTS over {http['connections']} CONNECTIONS ({http['reused']} reused)")
+    print(f"🧩 JSON CODEC: {stats['json_codec']}")
+    if stats["multi_query"]:
+        print(f"📦 {stats['multi_query']['queries']} QUERIES in {stats['multi_query']['posts']} POSTS")
+    if stats["cache"]:
+        cache = stats["cache"]
+        print(
+            f"🗄️ CACHE {cache['hits']} HITS / {cache['misses']} MISSES "
+            f"({cache['entries']} entries, {cache['bytes'] / 1e6:.1f} MB, {cache['evictions']} evicted)"
+        )
+    if stats["not_found_cache"]:
+        print(f"🚫 {stats['not_found_cache']['rejections']} UNKNOWN SCs REJECTED LOCALLY")
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main():
+    global TOKEN_CAPTURE_TIMEOUT, TOKEN_CAPTURE_BLOCK
+
+    parser = argparse.ArgumentParser(description="Textile Exchange scope certificate verification")
+    parser.add_argument("--batch", metavar="FILE", help="CSV / NDJSON / one-per-line file of SC numbers, '-' for stdin")
+    parser.add_argument("--concurrency", type=int, default=8, help="SC numbers verified in parallel in batch mode")
+    parser.add_argument("--output", default="TE_Batch_Results.ndjson", help="batch result records (NDJSON)")
+    parser.add_argument("--render", action="store_true", help="also write the HTML report and screenshot for each SC in batch mode")
+    parser.add_argument("--pool-size", type=int, help="pooled HTTP connections (default: concurrency x query workers)")
+    parser.add_argument("--multi-query", type=int, default=MULTI_QUERY_MAX, metavar="N", help="pack up to N queries into one QES POST (1 = off)")
+    parser.add_argument("--cache", default=CACHE_PATH, metavar="PATH", help="on-disk response cache (SQLite)")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL, metavar="SECONDS", help="serve cached responses younger than this")
+    parser.add_argument("--cache-size", type=float, default=CACHE_MAX_BYTES / 1e6, metavar="MB", help="evict least recently used responses beyond this size")
+    parser.add_argument("--no-cache", action="store_true", help="always query the service (no response or negative cache)")
+    parser.add_argument("--not-found-ttl", type=float, default=NEGATIVE_CACHE_TTL, metavar="SECONDS", help="reject SC numbers found unknown within this long without querying (0 = off)")
+    parser.add_argument("--record", metavar="DIR", help="save every query's request/response pair under DIR/<SC number>/")
+    parser.add_argument("--replay", metavar="DIR", help="answer queries from recordings in DIR instead of the service")
+    parser.add_argument("--json-codec", choices=("auto", "orjson", "json"), default=JSON_CODEC, help="JSON library for request and response bodies (auto: orjson when installed)")
+    parser.add_argument("--stream", action="store_true", help="decode responses while they download (needs ijson; no response cache)")
+    parser.add_argument("--stages", action="store_true", help="add per-stage timings to each batch record")
+    parser.add_argument("--token-timeout", type=float, default=TOKEN_CAPTURE_TIMEOUT, metavar="SECONDS", help="give up on token capture after this long")
+    parser.add_argument("--no-block", action="store_true", help="load every page resource during token capture")
+    args = parser.parse_args()
+
+    TOKEN_CAPTURE_TIMEOUT = args.token_timeout
+    TOKEN_CAPTURE_BLOCK = not args.no_block
+
+    configure_json_codec(args.json_codec)
+    configure_query_batching(args.multi_query)
+    configure_recording(record_dir=args.record, replay_dir=args.replay)
+    configure_stage_timing(args.stages)
+    if args.stream:
+        configure_streaming()
+
+    # a cache hit would skip recording, and replays should run the full path;
+    # cached bodies would also defeat streaming
+    if not (args.no_cache or args.record or args.replay or args.stream):
+        configure_response_cache(args.cache, ttl=args.cache_ttl, max_bytes=int(args.cache_size * 1e6))
+    # replays answer from the recordings, and --no-cache means every SC is asked for
+    if not (args.no_cache or args.replay):
+        configure_not_found_cache(args.cache, ttl=args.not_found_ttl)
+
+    if args.batch:
+        sc_numbers = read_sc_numbers(args.batch)
+        print(f"📋 {len(sc_numbers)} SC NUMBERS → {args.output} (concurrency {args.concurrency})")
+
+        summary = run_batch(
+            sc_numbers,
+            args.output,
+            concurrency=args.concurrency,
+            pool_size=args.pool_size,
+            render=args.render,
+        )
+
+        summary_path = os.path.splitext(args.output)[0] + "_summary.json"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print(
+            f"\n📊 {summary['ok']}/{summary['total']} VERIFIED, {summary['not_found']} NOT FOUND, {summary['error']} FAILED, "
+            f"{summary['render_error']} REPORTS FAILED in {summary['elapsed']:.1f}s → {summary_path}"
+        )
+        print_run_stats(summary)
+        return
+
+    # ------------------------------------------------------------
+    # USER INPUT
+    # ------------------------------------------------------------
+    sc_number = input("➡️ Enter SC Number: ").strip()
+
+    t0 = time.perf_counter()
+    try:
+        results = verify_sc(sc_number)
+    except Exception as e:
+        print(e)
+        exit()
+
+    print(f"\n⏱️ QUERIES COMPLETED IN {time.perf_counter() - t0:.2f}s")
+    print_run_stats(run_stats())
+
+    OUTPUT_HTML = render_html(sc_number, results)
+
+    print(f"✅ HTML GENERATED → {OUTPUT_HTML}")
+
+    OUTPUT_PNG = f"TE_Scope_Certificate_{sc_number}.png"
 
-asyncio.run(
     screenshot_html(OUTPUT_HTML, OUTPUT_PNG)
-)
 
-print(f"📸 SCREENSHOT GENERATED → {OUTPUT_PNG}")
+    print(f"📸 SCREENSHOT GENERATED → {OUTPUT_PNG}")
+
 
+if __name__ == "__main__":
+    main()